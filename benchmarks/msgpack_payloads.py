@@ -0,0 +1,52 @@
+"""
+Compares JSON and msgpack for the large list payloads: size of the page
+and the time to encode it on the server and decode it on the client.
+Rows come from the seed generator, no database needed.
+
+    $ python -m benchmarks.msgpack_payloads
+"""
+import json
+import time
+
+from src.dtos.encoding import response_media_type, unpackb, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+from src.dtos.viewmodels import nomenclature_row, user_admin_row, page_response
+from src.services.seeding import nomenclature_documents, user_documents
+
+ROWS = 1000
+ROUNDS = 50
+
+DECODERS = {JSON_MEDIA_TYPE: json.loads, MSGPACK_MEDIA_TYPE: unpackb}
+
+
+def timed(function, *args):
+    function(*args)
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        result = function(*args)
+    return result, (time.process_time() - start) / ROUNDS * 1000
+
+
+def encode(rows, media_type):
+    token = response_media_type.set(media_type)
+    try:
+        return page_response(rows, len(rows)).body
+    finally:
+        response_media_type.reset(token)
+
+
+def compare(name, rows):
+    print(f"{name}, {ROWS} rows page, mean of {ROUNDS} rounds")
+    for media_type, decode in DECODERS.items():
+        body, encode_ms = timed(encode, rows, media_type)
+        _, decode_ms = timed(decode, body)
+        print(f"{media_type:>20}: {len(body) / 1024:8.1f} KiB  "
+              f"encode {encode_ms:6.2f} ms  decode {decode_ms:6.2f} ms")
+
+
+def main():
+    compare("Nomenclatures", [nomenclature_row(raw) for raw in nomenclature_documents(ROWS)])
+    compare("Users", [user_admin_row(raw) for raw in user_documents(ROWS, "hash")])
+
+
+if __name__ == "__main__":
+    main()
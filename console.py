@@ -3,6 +3,8 @@ CLI tool to handle common tasks over the database or related
 with the server config. For example, we give an option to
 create a new USER (an admin in the future)
 """
+import os
+
 import click
 
 
@@ -32,5 +34,135 @@ def createuser(username, password):
     print(f"User {new_id} created successfully")
 
 
+def update_env_file(path, values):
+    lines = []
+    if os.path.exists(path):
+        with open(path) as f:
+            lines = f.read().splitlines()
+    pending = dict(values)
+    for i, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if key in pending:
+            lines[i] = f"{key}={pending.pop(key)}"
+    lines.extend(f"{key}={value}" for key, value in pending.items())
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@main.command(name="calibrate-hash")
+@click.option("--scheme", type=click.Choice(["bcrypt", "argon2"]), default="bcrypt", show_default=True)
+@click.option("--target-ms", type=float, default=250, show_default=True,
+              help="Target time for a single password hash on this machine")
+@click.option("--samples", type=int, default=3, show_default=True, help="Hashes measured per cost factor")
+@click.option("--memory-kib", type=int, default=None, help="Argon2 memory cost in KiB")
+@click.option("--save", is_flag=True, help="Write the recommended policy into the env file")
+@click.option("--env-file", default=os.path.join("src", ".env"), show_default=True)
+def calibrate_hash(scheme, target_ms, samples, memory_kib, save, env_file):
+    """
+    Benchmarks password hashing cost factors on the current machine
+    and recommends the highest one that stays within the target latency.
+    """
+    from src.services.hashing import calibrate
+    report = calibrate(scheme, target_ms, samples, memory_kib)
+    for result in report["results"]:
+        print(f"{scheme} cost={result['cost']:>2}: {result['ms']:.1f} ms")
+    print(f"Recommended {scheme} cost for {target_ms:.0f} ms: {report['recommended']}")
+
+    if save:
+        values = {"PASSWORD_HASH_SCHEME": scheme, "PASSWORD_HASH_COST": report["recommended"]}
+        if memory_kib is not None:
+            values["PASSWORD_HASH_MEMORY_KIB"] = memory_kib
+        update_env_file(env_file, values)
+        print(f"Password hash policy saved to {env_file}. Outdated hashes are upgraded on next login.")
+
+
+@main.command(name="generate-jwt-key")
+@click.option("--algorithm", type=click.Choice(["ES256", "RS256"]), default="ES256", show_default=True)
+@click.option("--out", required=True, type=click.Path(dir_okay=False), help="Where to write the private key (PEM)")
+def generate_jwt_key(algorithm, out):
+    """
+    Generates a private key to sign access tokens with an asymmetric
+    algorithm. Point JWT_PRIVATE_KEY_FILE to it and set JWT_ALGORITHM.
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+    from src.services.keys import KeySet
+    if algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    with open(os.open(out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        f.write(pem)
+    print(f"{algorithm} key written to {out} (kid {KeySet(algorithm, pem).kid})")
+
+
+async def seed_database(nomenclatures, users, seed, password, batch_size, concurrency, drop):
+    import time
+    from beanie import init_beanie
+    from src.dataaccess.database import db
+    from src.dataaccess.versions import nomenclature_versions
+    from src.dtos.models import User, Nomenclature, NomenclatureTombstone
+    from src.services.crypto import CryptoService
+    from src.services.seeding import nomenclature_documents, user_documents, insert_batches
+
+    document_models = [User, Nomenclature, NomenclatureTombstone]
+    if drop:
+        for model in document_models:
+            await db.drop_collection(model.Collection.name)
+    # creates the indexes before the load, as the API would
+    await init_beanie(db, document_models=document_models)
+
+    def progress(label, total):
+        started = time.perf_counter()
+
+        def report(inserted):
+            rate = inserted / (time.perf_counter() - started)
+            print(f"\r{label}: {inserted}/{total} ({rate:,.0f} docs/s)", end="", flush=True)
+        return report
+
+    if nomenclatures:
+        # every seeded nomenclature gets the version of the start of the
+        # load: clients that synced during the load must sync again from 0
+        version = await nomenclature_versions.server_time()
+        await insert_batches(
+            Nomenclature.get_motor_collection(),
+            nomenclature_documents(nomenclatures, seed, version),
+            batch_size, concurrency, progress("Nomenclatures", nomenclatures)
+        )
+        print()
+    if users:
+        # a single hash for every user, computed once
+        hashed_password = CryptoService.get_password_hash(password)
+        await insert_batches(
+            User.get_motor_collection(),
+            user_documents(users, hashed_password, seed),
+            batch_size, concurrency, progress("Users", users)
+        )
+        print()
+
+
+@main.command()
+@click.option("--nomenclatures", type=int, default=100_000, show_default=True)
+@click.option("--users", type=int, default=10_000, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True, help="Same seed, same dataset")
+@click.option("--password", default="seed-password", show_default=True, help="Password of every seeded user")
+@click.option("--batch-size", type=int, default=5000, show_default=True)
+@click.option("--concurrency", type=int, default=8, show_default=True, help="Batches inserted at once")
+@click.option("--drop", is_flag=True, help="Drop users and nomenclatures before seeding")
+def seed(nomenclatures, users, seed, password, batch_size, concurrency, drop):
+    """
+    Fills the database with a deterministic synthetic dataset, to profile
+    and benchmark the API at production scale. Seeding twice with the same
+    seed and without --drop fails on duplicate ids.
+    """
+    import asyncio
+    asyncio.run(seed_database(nomenclatures, users, seed, password, batch_size, concurrency, drop))
+
+
 if __name__ == '__main__':
     main()
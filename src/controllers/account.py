@@ -2,6 +2,7 @@ from fastapi import Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm
 from src.dtos.models import Token, RefreshTokenForm, SCOPES
 from src.services.crypto import CryptoService
+from src.services.policy import policy
 from datetime import timedelta, datetime
 from typing import List
 from .routers import ApiController
@@ -19,24 +20,29 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_requested_scopes = list(set(user.scopes).intersection(set(form_data.scopes)))
+    # the scopes asked for (wildcards allowed) among those the user holds
+    # on its own or through its roles
+    roles = list(role.name for role in user.roles)
+    granted = policy.grants(user.scopes, roles) & policy.scope_mask(tuple(form_data.scopes))
+    user_requested_scopes = list(policy.scope_names(granted))
     access_token_expires = timedelta(minutes=60)
     refresh_token_expires = timedelta(days=31)
     access_token = CryptoService.create_access_token(
         data={
             "sub": user.username,
-            "scopes": user_requested_scopes,
-            "roles": list(role.name for role in user.roles),
+            **policy.claims(granted),
+            "roles": roles,
             "full_name": user.full_name,
             "email": user.email
         },
         expires_delta=access_token_expires
     )
+    # Refresh tokens outlive scope list changes, so they keep the names
     refresh_token = CryptoService.create_access_token(
         data={
             "sub": user.username,
             "scopes": user_requested_scopes,
-            "roles": list(role.name for role in user.roles),
+            "roles": roles,
             "full_name": user.full_name,
             "email": user.email
         },
@@ -61,7 +67,7 @@ async def refresh_access_token(refresh_token_form: RefreshTokenForm = Body(...))
     new_access_token = CryptoService.create_access_token(
         data={
             "sub": user.username,
-            "scopes": scopes,
+            **policy.claims(policy.scope_mask(tuple(scopes))),
             "roles": list(role.name for role in user.roles),
             "full_name": user.full_name,
             "email": user.email
@@ -82,6 +88,7 @@ def get_available_permissions():
     List the available permissions in the system an user can ask for when
     signing in.
     System handles login and assign each user the intersection between its
-    assigned permissions and the asked permissions.
+    assigned permissions (its own and those of its roles) and the asked
+    permissions, which may use wildcards such as 'nomenclature:*'.
     """
     return list(SCOPES.keys())
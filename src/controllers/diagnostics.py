@@ -0,0 +1,99 @@
+from typing import List
+
+from fastapi import Security, Query, status
+
+from src.dataaccess.profiling import slow_query_log, slow_query_log_enabled
+from src.dtos.viewmodels import (
+    Response, LoopLagViewModel, CoalescingViewModel, AdmissionClassViewModel,
+    SlowQueryShapeViewModel, EventHubViewModel
+)
+from src.services.crypto import adminRole
+from src.services.admission import admission_controller, admission_enabled
+from src.services.coalescing import single_flight_group
+from src.services.events import nomenclature_events
+from src.services.watchdog import loop_watchdog
+from .routers import ApiController
+
+router = ApiController(prefix='/diagnostics', tags=['Diagnostics'])
+
+
+@router.get(
+    '/loop',
+    response_model=Response[LoopLagViewModel],
+    dependencies=[Security(adminRole, scopes=['diagnostics:read'])]
+)
+async def get_loop_lag(top: int = Query(10, ge=1, le=100)):
+    """
+    Returns the event loop lag histogram of this worker and the call
+    sites that blocked the loop the most, along with the route that was
+    being served. Requires Admin role and 'diagnostics:read' permission.
+    The watchdog must be enabled with LOOP_WATCHDOG_ENABLED.
+    """
+    if not loop_watchdog.running:
+        return Response(status_code=status.HTTP_404_NOT_FOUND, message="Loop watchdog is not enabled")
+    return Response(data=loop_watchdog.report(top))
+
+
+@router.get(
+    '/coalescing',
+    response_model=Response[CoalescingViewModel],
+    dependencies=[Security(adminRole, scopes=['diagnostics:read'])]
+)
+async def get_coalescing_stats():
+    """
+    Returns, per coalesced route, how many times its handler actually ran
+    and how many concurrent identical requests were served by a call
+    already in flight. Requires Admin role and 'diagnostics:read' permission.
+    """
+    return Response(data=single_flight_group.report())
+
+
+@router.get(
+    '/events',
+    response_model=Response[EventHubViewModel],
+    dependencies=[Security(adminRole, scopes=['diagnostics:read'])]
+)
+async def get_event_hub_stats():
+    """
+    Returns the subscribers connected to the nomenclature event stream of
+    this worker, the events buffered for resuming, and how many events
+    were published and slow subscribers dropped so far.
+    Requires Admin role and 'diagnostics:read' permission.
+    """
+    return Response(data=nomenclature_events.report())
+
+
+@router.get(
+    '/admission',
+    response_model=Response[List[AdmissionClassViewModel]],
+    dependencies=[Security(adminRole, scopes=['diagnostics:read'])]
+)
+async def get_admission_stats():
+    """
+    Returns, per admission class, its limits, the requests running and
+    waiting right now and how many were admitted, queued and shed so far.
+    Requires Admin role and 'diagnostics:read' permission. Admission
+    control must be enabled with ADMISSION_CONTROL_ENABLED.
+    """
+    if not admission_enabled:
+        return Response(status_code=status.HTTP_404_NOT_FOUND, message="Admission control is not enabled")
+    return Response(data=admission_controller.report())
+
+
+@router.get(
+    '/slow-queries',
+    response_model=Response[List[SlowQueryShapeViewModel]],
+    dependencies=[Security(adminRole, scopes=['diagnostics:read'])]
+)
+async def get_slow_queries(top: int = Query(50, ge=1, le=200)):
+    """
+    Returns the database commands slower than SLOW_QUERY_THRESHOLD_MS seen
+    by this worker, grouped by query shape (the query with its values
+    replaced by '?'), with duration percentiles and the explain plan of
+    the first occurrence of each shape. Requires Admin role and
+    'diagnostics:read' permission. The log must be enabled with
+    SLOW_QUERY_LOG_ENABLED.
+    """
+    if not slow_query_log_enabled:
+        return Response(status_code=status.HTTP_404_NOT_FOUND, message="Slow query log is not enabled")
+    return Response(data=slow_query_log.report(top))
@@ -1,4 +1,7 @@
-from fastapi import status
+from fastapi import status, Response as HTTPResponse
+
+from src.dtos.viewmodels import Response, ReadinessViewModel
+from src.services.warmup import warmup_state, ping_database
 from .routers import ApiController
 
 router = ApiController(prefix='/health', tags=['health'])
@@ -7,3 +10,40 @@ router = ApiController(prefix='/health', tags=['health'])
 @router.get('/', status_code=status.HTTP_200_OK)
 async def health_check():
     return "Server is alive"
+
+
+@router.get('/live', status_code=status.HTTP_200_OK)
+async def liveness_check():
+    """
+    Liveness probe. Only tells the process is up and serving requests,
+    it does not touch any dependency.
+    """
+    return "Server is alive"
+
+
+@router.get('/ready', response_model=Response[ReadinessViewModel])
+async def readiness_check(response: HTTPResponse):
+    """
+    Readiness probe. Reports 200 only after the startup warm-up finished
+    and the database answers a ping, 503 otherwise (with "Warming up" while
+    the warm-up runs), so a new instance does not receive traffic while it
+    is still cold.
+    """
+    readiness = ReadinessViewModel(
+        ready=warmup_state.ready,
+        started_at=warmup_state.started_at,
+        finished_at=warmup_state.finished_at,
+        steps=warmup_state.steps,
+    )
+    if readiness.ready:
+        try:
+            readiness.mongo_latency_ms = await ping_database()
+        except Exception:
+            readiness.ready = False
+
+    response.status_code = status.HTTP_200_OK if readiness.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return Response(
+        data=readiness,
+        status_code=response.status_code,
+        message="Ready" if readiness.ready else "Warming up" if warmup_state.warming else "Not ready"
+    )
@@ -1,15 +1,26 @@
 from re import finditer
 from typing import List, Optional
 
-from fastapi import Path, Security, Body, Depends, status
+from fastapi import Path, Security, Body, Depends, Query, Header, status, Response as HTTPResponse
+from fastapi.responses import StreamingResponse
 
-from src.dependencies import get_filters, get_nomenclature
+from src.dataaccess.commands import update_by_id, insert_versioned, delete_with_tombstone
+from src.dataaccess.queries import find_rows
+from src.dataaccess.versions import nomenclature_versions, find_changes, merge_changes
+from src.dependencies import (
+    get_filters, get_nomenclature, get_expected_revision, raise_on_conflict, etag,
+    get_read_session, get_write_session, set_causal_token
+)
 from src.dtos.viewmodels import (
     Response, NomenclatureForm, Page, NomenclatureViewModel,
-    NomenclatureTypeViewModel
+    NomenclatureTypeViewModel, NomenclatureChangesViewModel,
+    nomenclature_row, NOMENCLATURE_PROJECTION, page_response
 )
-from src.dtos.models import Nomenclature, PagingModel
+from src.dtos.models import Nomenclature, NomenclatureTombstone, PagingModel, PyObjectId
 from src.services.crypto import adminRole, anyRole
+from src.services.search import nomenclature_index
+from src.services.coalescing import single_flight
+from src.services.events import nomenclature_events, publish_local, CREATED, UPDATED, DELETED
 from src.inmutables import NomenclatureType
 from .routers import ApiController
 
@@ -26,15 +37,21 @@ def camel_case_split(identifier):
     response_model=Response[Page[NomenclatureViewModel]],
     dependencies=[Security(adminRole, scopes=['nomenclature:read'])]
 )
-async def get_all_nomenclatures(paging: PagingModel = Depends(), filters: dict = Depends(get_filters)):
+@single_flight
+async def get_all_nomenclatures(
+        paging: PagingModel = Depends(),
+        filters: dict = Depends(get_filters),
+        session=Depends(get_read_session)
+):
     """
     Returns all nomenclatures defined on the system.
     This endpoint requires the Admin role and 'nomenclature:read'
     permission
     """
-    nomenclatures = await Nomenclature.find(filters).skip(paging.skip).limit(paging.limit).to_list()
-    total = await Nomenclature.find(filters).count()
-    return Response(data=Page(items=nomenclatures, total=total, records=len(nomenclatures)))
+    rows, total = await find_rows(
+        Nomenclature, filters, nomenclature_row, NOMENCLATURE_PROJECTION, paging.skip, paging.limit, session
+    )
+    return page_response(rows, total)
 
 
 @router.get('/types', response_model=Response[List[NomenclatureTypeViewModel]])
@@ -55,21 +72,117 @@ def get_all_nomenclature_types():
                    } for e in NomenclatureType))
 
 
+@router.get(
+    '/search',
+    response_model=Response[List[NomenclatureViewModel]],
+    dependencies=[Security(anyRole, scopes=['nomenclature:read'])]
+)
+@single_flight
+async def search_nomenclatures(
+        q: str = Query(..., min_length=2, description="Text the user typed so far, at least 2 characters"),
+        nomenclature_type: Optional[NomenclatureType] = Query(None, alias='type'),
+        limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Typeahead search over nomenclature names and descriptions. Every word
+    in q must be the beginning of a word in the name or the description,
+    ignoring case and accents. Results that start with q come first.
+    Requires 'nomenclature:read' permission.
+    """
+    return Response(data=nomenclature_index.search(q, nomenclature_type, limit))
+
+
+@router.get(
+    '/changes',
+    response_model=Response[NomenclatureChangesViewModel],
+    dependencies=[Security(anyRole, scopes=['nomenclature:read'])]
+)
+@single_flight
+async def get_nomenclature_changes(
+        since: int = Query(0, ge=0),
+        after: Optional[PyObjectId] = Query(None, description="'after' of the previous page, if it had more changes"),
+        limit: int = Query(1000, ge=1, le=10000)
+):
+    """
+    Delta sync of the nomenclature catalog. Returns up to `limit`
+    nomenclatures created or updated and ids of those deleted after
+    version `since`, in version order, along with the position to ask from
+    on the next sync: send `version` as since, and `after` too when there
+    are `more` changes to fetch. Use since=0 for a full download. Changes
+    are read from the primary, so a sync never skips a write a lagging
+    secondary has not seen yet.
+    Requires 'nomenclature:read' permission.
+    """
+    version = await nomenclature_versions.high_water_mark()
+    if since > version or (since == version and after is None):
+        return Response(data=NomenclatureChangesViewModel(since=since, version=since))
+
+    upserts = await find_changes(
+        Nomenclature.get_motor_collection(), since, after, version, limit + 1, NOMENCLATURE_PROJECTION
+    )
+    deletes = await find_changes(
+        NomenclatureTombstone.get_motor_collection(), since, after, version, limit + 1, {"version": 1}
+    )
+    page, more = merge_changes(upserts, deletes, limit)
+    # a tombstone of a document that is still there belongs to a delete in
+    # progress or one that failed half way (see delete_with_tombstone)
+    deleted = [raw["_id"] for raw, is_delete in page if is_delete]
+    live = set(await Nomenclature.get_motor_collection().distinct("_id", {"_id": {"$in": deleted}})) if deleted else set()
+    last = page[-1][0] if page else None
+    return Response(data=NomenclatureChangesViewModel(
+        since=since,
+        version=last["version"] if more else version,
+        after=last["_id"] if more else None,
+        more=more,
+        upserts=[nomenclature_row(raw) for raw, is_delete in page if not is_delete],
+        deletes=[id for id in deleted if id not in live]
+    ))
+
+
+@router.get(
+    '/events',
+    response_class=StreamingResponse,
+    dependencies=[Security(anyRole, scopes=['nomenclature:read'])]
+)
+async def get_nomenclature_events(
+        last_event_id: Optional[int] = Header(None),
+        since: Optional[int] = Query(None, ge=0, description="Last event id seen, for clients that can not send Last-Event-ID")
+):
+    """
+    Server-Sent Events stream of the changes to the nomenclature catalog:
+    'created', 'updated' (the nomenclature as data) and 'deleted' (its id).
+    Event ids are change versions, so reconnecting with Last-Event-ID
+    replays what was missed. If those events are gone the stream sends a
+    'reset' event, and the client must sync with /changes?since=<id>.
+    Requires 'nomenclature:read' permission.
+    """
+    return StreamingResponse(
+        nomenclature_events.stream(last_event_id if last_event_id is not None else since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get(
     '/{id}',
     response_model=Response[NomenclatureViewModel],
     dependencies=[Security(adminRole, scopes=['nomenclature:read'])]
 
 )
-async def get_nomenclature_by_id(nomenclature: Optional[Nomenclature] = Depends(get_nomenclature)):
+async def get_nomenclature_by_id(
+        response: HTTPResponse,
+        nomenclature: Optional[Nomenclature] = Depends(get_nomenclature)
+):
     """
     Returns al the details of a nomenclature. This is useful for
-    populating a form for editing the nomenclature.
+    populating a form for editing the nomenclature. The ETag header
+    can be sent back as If-Match when updating it.
     Requires an Admin role and 'nomenclature:read' permissions.
     """
     if nomenclature is None:
         return Response(status_code=status.HTTP_404_NOT_FOUND, message="Nomenclature not found")
 
+    response.headers['ETag'] = etag(nomenclature.revision)
     return Response(data=nomenclature)
 
 
@@ -78,18 +191,21 @@ async def get_nomenclature_by_id(nomenclature: Optional[Nomenclature] = Depends(
     response_model=Response[Page[NomenclatureViewModel]],
     dependencies=[Security(anyRole, scopes=['nomenclature:read'])]
 )
-async def get_nomenclatures_by_type(nomenclature_type: NomenclatureType = Path(...)):
+@single_flight
+async def get_nomenclatures_by_type(
+        nomenclature_type: NomenclatureType = Path(...),
+        session=Depends(get_read_session)
+):
     """
     Gets all nomenclatures that belongs to a specific type.
     This is useful for populating select boxes on entities
     that depends on a given nomenclature.
     Requires 'nomenclature:read' permission.
     """
-    nomenclatures = await Nomenclature.find(Nomenclature.type_ == nomenclature_type).to_list()
-    total = await Nomenclature.find(Nomenclature.type_ == nomenclature_type).count()
-    return Response(
-        data=Page(items=nomenclatures, records=len(nomenclatures), total=total)
+    rows, total = await find_rows(
+        Nomenclature, {"type": nomenclature_type.value}, nomenclature_row, NOMENCLATURE_PROJECTION, session=session
     )
+    return page_response(rows, total)
 
 
 @router.delete(
@@ -97,16 +213,26 @@ async def get_nomenclatures_by_type(nomenclature_type: NomenclatureType = Path(.
     response_model=Response[Nomenclature],
     dependencies=[Security(adminRole, scopes=['nomenclature:delete'])]
 )
-async def delete_nomenclature(nomenclature: Optional[Nomenclature] = Depends(get_nomenclature)):
+async def delete_nomenclature(
+        response: HTTPResponse,
+        id: PyObjectId,
+        expected_revision: Optional[int] = Depends(get_expected_revision),
+        session=Depends(get_write_session)
+):
     """
     Deletes a nomenclature from the system. It requires "users:delete" permission
-    and an admin Role
+    and an admin Role. Send the ETag of the nomenclature as If-Match to delete
+    it only if nobody modified it since it was read, otherwise a 412 is returned.
     """
-    if nomenclature is not None:
-        deleted = (await nomenclature.delete()).deleted_count == 1
-        if deleted:
-            return Response(message="Delete successfully", data=nomenclature, status_code=status.HTTP_202_ACCEPTED)
+    raw, version = await delete_with_tombstone(Nomenclature, NomenclatureTombstone, id, expected_revision, session)
+    if raw is not None:
+        nomenclature = Nomenclature.parse_obj(raw)
+        nomenclature_index.remove(nomenclature.id)
+        publish_local(DELETED, version, {"_id": str(nomenclature.id)})
+        set_causal_token(response, session)
+        return Response(message="Delete successfully", data=nomenclature, status_code=status.HTTP_202_ACCEPTED)
 
+    await raise_on_conflict(Nomenclature, id, expected_revision)
     return Response(message="Nomenclature could not been deleted", status_code=status.HTTP_400_BAD_REQUEST)
 
 
@@ -115,13 +241,21 @@ async def delete_nomenclature(nomenclature: Optional[Nomenclature] = Depends(get
     response_model=Response[NomenclatureViewModel],
     dependencies=[Security(adminRole, scopes=['nomenclature:write'])]
 )
-async def create_nomenclature(model: NomenclatureForm = Body(...)):
+async def create_nomenclature(
+        response: HTTPResponse,
+        model: NomenclatureForm = Body(...),
+        session=Depends(get_write_session)
+):
     """
     Creates a new nomenclature and returns the new object.
     Requires Admin role and 'nomenclature:write' permission.
     """
-    nomenclature = await Nomenclature(**model.dict(exclude_unset=True)).insert()
-    return Response(data=nomenclature)
+    raw = await insert_versioned(Nomenclature, Nomenclature(**model.dict(exclude_unset=True)), session)
+    row = nomenclature_row(raw)
+    nomenclature_index.add(row)
+    publish_local(CREATED, raw["version"], row)
+    set_causal_token(response, session)
+    return Response(data=Nomenclature.parse_obj(raw))
 
 
 @router.patch(
@@ -130,13 +264,29 @@ async def create_nomenclature(model: NomenclatureForm = Body(...)):
     dependencies=[Security(adminRole, scopes=['nomenclature:write'])]
 )
 async def update_nomenclature(
-        nomenclature: Optional[Nomenclature] = Depends(get_nomenclature),
-        model: NomenclatureForm = Body(...)
+        response: HTTPResponse,
+        id: PyObjectId,
+        model: NomenclatureForm = Body(...),
+        expected_revision: Optional[int] = Depends(get_expected_revision),
+        session=Depends(get_write_session)
 ):
     """
     Updates the data collected in model to the Nomenclature
-    represented by id. Requires Admin role and nomenclature:write permission
+    represented by id. Requires Admin role and nomenclature:write permission.
+    Send the ETag of the nomenclature as If-Match to update it only if nobody
+    modified it since it was read, otherwise a 412 is returned.
     """
-    if nomenclature is not None:
-        await nomenclature.set(model.dict(exclude_unset=True))
+    raw = await update_by_id(
+        Nomenclature, id, model.dict(exclude_unset=True), expected_revision, session, stamp_version=True
+    )
+    if raw is not None:
+        nomenclature = Nomenclature.parse_obj(raw)
+        row = nomenclature_row(raw)
+        nomenclature_index.add(row)
+        publish_local(UPDATED, raw["version"], row)
+        response.headers['ETag'] = etag(nomenclature.revision)
+        set_causal_token(response, session)
         return Response(status_code=status.HTTP_201_CREATED, data=nomenclature)
+
+    await raise_on_conflict(Nomenclature, id, expected_revision)
+    return Response(status_code=status.HTTP_404_NOT_FOUND, message="Nomenclature not found")
@@ -1,7 +1,21 @@
-from typing import Callable
+import inspect
+import json
+from contextlib import AsyncExitStack
+from typing import Any, Callable, Coroutine
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
 from fastapi.types import DecoratedCallable
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.dtos.encoding import (
+    msgpack, response_media_type, negotiate, is_msgpack, unpackb, MsgPackResponse,
+    JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+)
+from src.services.coalescing import single_flight_group
 
 
 class ApiController(APIRouter):
@@ -23,6 +37,9 @@ class ApiController(APIRouter):
     Co-opted from https://github.com/tiangolo/fastapi/issues/2060#issuecomment-974527690
     """
 
+    def __init__(self, *args, route_class=None, **kwargs):
+        super().__init__(*args, route_class=route_class or NegotiatingRoute, **kwargs)
+
     def api_route(self, path: str, *, include_in_schema: bool = True, **kwargs) -> Callable[[DecoratedCallable], DecoratedCallable]:
         given_path = path
         path_no_slash = given_path[:-1] if given_path.endswith("/") else given_path
@@ -44,3 +61,111 @@ class ApiController(APIRouter):
             return add_nontrailing_slash_path(func)
 
         return add_trailing_slash_path if given_path == "/" else add_path_and_trailing_slash
+
+
+class CoalescingRoute(APIRoute):
+    """
+    Route that coalesces concurrent identical GET requests into a single
+    execution when its endpoint is marked with @single_flight.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        if "GET" not in self.methods or not getattr(self.endpoint, "__single_flight__", False):
+            return handler
+
+        async def shared_handler(request: Request) -> Response:
+            # The yield dependencies of the shared call (e.g. the database
+            # session) go on a stack of its own instead of the stack of the
+            # leader request, which closes them when the leader goes away
+            # while followers still wait for the call
+            async with AsyncExitStack() as stack:
+                scope = dict(request.scope)
+                scope["fastapi_astack"] = stack
+                return await handler(Request(scope, request.receive))
+
+        async def coalesced_handler(request: Request) -> Response:
+            key = single_flight_group.key_for(request, self.path_format)
+            if key is None:
+                return await handler(request)
+            return await single_flight_group.run(key, self.path_format, lambda: shared_handler(request))
+
+        return coalesced_handler
+
+
+class NegotiatingRoute(CoalescingRoute):
+    """
+    Route that reads msgpack request bodies and answers in msgpack when
+    the client prefers it in Accept. Lean responses are encoded straight to
+    msgpack (see src.dtos.encoding.render), the JSON rendered from response
+    models is re-encoded.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def negotiating_handler(request: Request) -> Response:
+            media_type = negotiate(request.headers.get("accept", ""))
+            token = response_media_type.set(media_type)
+            try:
+                if is_msgpack(request.headers.get("content-type", "")):
+                    request = await msgpack_request(request)
+                response = await handler(request)
+            except (StarletteHTTPException, RequestValidationError) as exc:
+                if media_type != MSGPACK_MEDIA_TYPE:
+                    raise
+                # Rendered here instead of by the app, so errors (failed
+                # authorization, invalid bodies) are negotiated as well
+                response = await handle_exception(request, exc)
+            finally:
+                response_media_type.reset(token)
+            content_type = response.headers.get("content-type", "")
+            if media_type == MSGPACK_MEDIA_TYPE and content_type.startswith(JSON_MEDIA_TYPE):
+                response = transcode(response)
+            if msgpack is not None and content_type.startswith((JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE)):
+                response.headers["Vary"] = "Accept"
+            return response
+
+        return negotiating_handler
+
+
+async def handle_exception(request: Request, exc: Exception) -> Response:
+    handlers = request.app.exception_handlers
+    for cls in type(exc).__mro__:
+        if cls in handlers:
+            response = handlers[cls](request, exc)
+            return await response if inspect.isawaitable(response) else response
+    raise exc
+
+
+async def msgpack_request(request: Request) -> Request:
+    """
+    Decodes a msgpack body into a request FastAPI reads as JSON
+    """
+    if msgpack is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="msgpack is not supported")
+    body = await request.body()
+    if not body:
+        return request
+    try:
+        payload = unpackb(body)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The msgpack body could not be decoded")
+    scope = dict(request.scope)
+    scope["headers"] = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+    scope["headers"].append((b"content-type", JSON_MEDIA_TYPE.encode()))
+    decoded = Request(scope, request.receive)
+    decoded._body = body
+    decoded._json = payload
+    return decoded
+
+
+def transcode(response: Response) -> Response:
+    encoded = MsgPackResponse(json.loads(response.body), status_code=response.status_code,
+                              background=response.background)
+    encoded.raw_headers = [
+        (name, value) for name, value in response.raw_headers if name not in (b"content-type", b"content-length")
+    ] + [
+        (name, value) for name, value in encoded.raw_headers if name in (b"content-type", b"content-length")
+    ]
+    return encoded
@@ -1,16 +1,24 @@
 from typing import Optional
 
-from fastapi import Security, status, Depends, Body
-
-from src.dependencies import get_filters, get_user_from_request
+from fastapi import Security, status, Depends, Body, Response as HTTPResponse
+
+from src.dataaccess.commands import update_by_id, delete_by_id
+from src.dataaccess.queries import find_rows
+from src.dependencies import (
+    get_filters, get_user_from_request, get_expected_revision,
+    raise_on_conflict, etag, get_read_session, get_write_session,
+    set_causal_token
+)
 from src.dtos.viewmodels import (
     UserAdminViewModel,
     CreatedUserAdminViewModel,
     CreateUserRequestModel, UpdateUserRequestModel,
-    Response, Page, LoggedUser
+    Response, Page, LoggedUser,
+    user_admin_row, USER_ADMIN_PROJECTION, page_response
 )
-from src.dtos.models import User, PagingModel
+from src.dtos.models import User, PagingModel, PyObjectId
 from src.services.crypto import adminRole, anyRole, CryptoService
+from src.services.coalescing import single_flight
 from .routers import ApiController
 
 router = ApiController(prefix="/user", tags=["Users"])
@@ -33,14 +41,16 @@ def get_user(user: LoggedUser = Security(anyRole, scopes=["users:read"])):
     response_model=Response[UserAdminViewModel],
     dependencies=[Security(adminRole, scopes=["users:read"])]
 )
-async def get_user_as_admin(user: Optional[User] = Depends(get_user_from_request)):
+async def get_user_as_admin(response: HTTPResponse, user: Optional[User] = Depends(get_user_from_request)):
     """
     Gets an user representation for displaying in a view in an admin
     view. This representation only gets displayed by if the logged in
-    user is an admin and has read access over users.
+    user is an admin and has read access over users. The ETag header
+    can be sent back as If-Match when updating it.
     """
     if user is None:
         return Response(status_code=status.HTTP_404_NOT_FOUND, message="User not found")
+    response.headers['ETag'] = etag(user.revision)
     return Response(data=user)
 
 
@@ -49,16 +59,19 @@ async def get_user_as_admin(user: Optional[User] = Depends(get_user_from_request
     response_model=Response[Page[UserAdminViewModel]],
     dependencies=[Security(adminRole, scopes=["users:read"])]
 )
-async def list_users_as_admin(paging: PagingModel = Depends(), filters: dict = Depends(get_filters)):
+@single_flight
+async def list_users_as_admin(
+        paging: PagingModel = Depends(),
+        filters: dict = Depends(get_filters),
+        session=Depends(get_read_session)
+):
     """
     Gets the list of users with an extended field representation.
     This endpoint is meant for admins with read access over the
     users.
     """
-    filters = {f.field: f.value for f in filters}
-    users = await User.find(filters).skip(paging.skip).limit(paging.limit).to_list()
-    total = await User.find(filters).count()
-    return Response(data=Page(items=users, total=total, records=len(users)))
+    rows, total = await find_rows(User, filters, user_admin_row, USER_ADMIN_PROJECTION, paging.skip, paging.limit, session)
+    return page_response(rows, total)
 
 
 @router.post(
@@ -66,7 +79,11 @@ async def list_users_as_admin(paging: PagingModel = Depends(), filters: dict = D
     response_model=Response[CreatedUserAdminViewModel],
     dependencies=[Security(adminRole, scopes=["users:write"])]
 )
-async def create_user_as_admin(model: CreateUserRequestModel = Body(...)):
+async def create_user_as_admin(
+        response: HTTPResponse,
+        model: CreateUserRequestModel = Body(...),
+        session=Depends(get_write_session)
+):
     """
     Creates a new user in the system. The caller of this
     endpoint must be an admin with write access privileges
@@ -79,7 +96,8 @@ async def create_user_as_admin(model: CreateUserRequestModel = Body(...)):
     # autogenerate a strong password
     password = CryptoService.generate_strong_password()
     data['hashed_password'] = CryptoService.get_password_hash(password)
-    user = await User(**data).insert()
+    user = await User(**data).insert(session=session)
+    set_causal_token(response, session)
     return Response(
         data=CreatedUserAdminViewModel(id=user.id, password=password),
         status_code=status.HTTP_201_CREATED
@@ -91,15 +109,22 @@ async def create_user_as_admin(model: CreateUserRequestModel = Body(...)):
     response_model=Response[str],
     dependencies=[Security(adminRole, scopes=['users:delete'])]
 )
-async def delete_user_as_admin(user: User = Depends(get_user_from_request)):
+async def delete_user_as_admin(
+        response: HTTPResponse,
+        id: PyObjectId,
+        expected_revision: Optional[int] = Depends(get_expected_revision),
+        session=Depends(get_write_session)
+):
     """
     Deletes an user from the system. It requires "users:delete" permission
-    and an admin Role
+    and an admin Role. Send the ETag of the user as If-Match to delete it
+    only if nobody modified it since it was read, otherwise a 412 is returned.
     """
-    if user is not None:
-        if (await user.delete()).deleted_count == 1:
-            return Response(message="Delete successfully", data=id, status_code=status.HTTP_202_ACCEPTED)
+    if await delete_by_id(User, id, expected_revision, session) is not None:
+        set_causal_token(response, session)
+        return Response(message="Delete successfully", data=str(id), status_code=status.HTTP_202_ACCEPTED)
 
+    await raise_on_conflict(User, id, expected_revision)
     return Response(message="User could not been deleted", status_code=status.HTTP_400_BAD_REQUEST)
 
 
@@ -109,15 +134,23 @@ async def delete_user_as_admin(user: User = Depends(get_user_from_request)):
     dependencies=[Security(adminRole, scopes=['users:write'])]
 )
 async def update_user_as_admin(
-        user: Optional[User] = Depends(get_user_from_request),
+        response: HTTPResponse,
+        id: PyObjectId,
         model: UpdateUserRequestModel = Body(...),
+        expected_revision: Optional[int] = Depends(get_expected_revision),
+        session=Depends(get_write_session)
 ):
     """
     Updates an user information. Requires an admin with "users:write"
-    permissions
+    permissions. Send the ETag of the user as If-Match to update it only
+    if nobody modified it since it was read, otherwise a 412 is returned.
     """
-    if user is not None:
-        await user.set(model.dict(exclude_unset=True))
+    raw = await update_by_id(User, id, model.dict(exclude_unset=True), expected_revision, session)
+    if raw is not None:
+        user = User.parse_obj(raw)
+        response.headers['ETag'] = etag(user.revision)
+        set_causal_token(response, session)
         return Response(data=user, status_code=status.HTTP_201_CREATED)
 
+    await raise_on_conflict(User, id, expected_revision)
     return Response(status_code=status.HTTP_400_BAD_REQUEST, message="Failed to update user")
@@ -0,0 +1,17 @@
+from fastapi import Response as HTTPResponse
+
+from src.services.keys import signing_keys
+from .routers import ApiController
+
+router = ApiController(prefix='/.well-known', tags=['Well known'])
+
+
+@router.get('/jwks.json')
+def get_jwks(response: HTTPResponse):
+    """
+    Public keys that verify the access tokens issued by this API, as a
+    JSON Web Key Set. Tokens name the key that signed them in their `kid`
+    header. Empty while tokens are signed with a shared secret (HS256).
+    """
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return signing_keys.jwks()
@@ -0,0 +1,125 @@
+"""
+Single round trip write commands. Each of them finds the document by id
+(and optionally by its expected revision) and modifies it in the same
+call, so concurrent writers can not silently overwrite each other.
+"""
+from typing import Optional, Tuple, Type
+
+from beanie import Document
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClientSession
+from pymongo import ReturnDocument
+
+from src.dataaccess.versions import versioned
+from src.dtos.models import PyObjectId
+
+
+def _revision_filter(id: PyObjectId, expected_revision: Optional[int]) -> dict:
+    query = {"_id": id}
+    if expected_revision is not None:
+        # documents written before revisions existed count as revision 0
+        query["revision"] = expected_revision if expected_revision else {"$in": [0, None]}
+    return query
+
+
+async def update_by_id(
+        document_type: Type[Document],
+        id: PyObjectId,
+        data: dict,
+        expected_revision: Optional[int] = None,
+        session: Optional[AsyncIOMotorClientSession] = None,
+        stamp_version: bool = False
+) -> Optional[dict]:
+    """
+    Sets `data` on the document and bumps its revision, and its change
+    version with `stamp_version` (see versions.py). Returns the updated
+    raw document, or None if there is no document with that id and
+    revision.
+    """
+    if stamp_version:
+        update = versioned(data, revision={"$add": [{"$ifNull": ["$revision", 0]}, 1]})
+    else:
+        update = {"$inc": {"revision": 1}}
+        # an empty PATCH body, MongoDB before 5.0 rejects an empty $set
+        if data:
+            update["$set"] = data
+    return await document_type.get_motor_collection().find_one_and_update(
+        _revision_filter(id, expected_revision),
+        update,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+
+async def delete_by_id(
+        document_type: Type[Document],
+        id: PyObjectId,
+        expected_revision: Optional[int] = None,
+        session: Optional[AsyncIOMotorClientSession] = None
+) -> Optional[dict]:
+    """
+    Deletes the document and returns it as it was before the deletion,
+    or None if there is no document with that id and revision.
+    """
+    return await document_type.get_motor_collection().find_one_and_delete(
+        _revision_filter(id, expected_revision),
+        session=session
+    )
+
+
+async def insert_versioned(
+        document_type: Type[Document],
+        document: Document,
+        session: Optional[AsyncIOMotorClientSession] = None
+) -> dict:
+    """
+    Inserts the document stamped with its change version, and returns it
+    as stored.
+    """
+    id = document.id or ObjectId()
+    data = document.dict(by_alias=True, exclude={"id", "revision_id", "version"})
+    return await document_type.get_motor_collection().find_one_and_update(
+        {"_id": id},
+        versioned(data),
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+
+
+async def delete_with_tombstone(
+        document_type: Type[Document],
+        tombstone_type: Type[Document],
+        id: PyObjectId,
+        expected_revision: Optional[int] = None,
+        session: Optional[AsyncIOMotorClientSession] = None
+) -> Tuple[Optional[dict], Optional[int]]:
+    """
+    Deletes the document leaving a tombstone with the change version of
+    the deletion, so syncing clients learn about it. Returns the deleted
+    raw document and the version, or (None, None) if there is no document
+    with that id and revision.
+    The tombstone is written first: if the process dies before the delete,
+    a tombstone of a live document is left (readers must skip those)
+    instead of a deletion nobody hears about. It does not need a
+    transaction, which standalone servers do not support.
+    """
+    tombstones = tombstone_type.get_motor_collection()
+    tombstone = await tombstones.find_one_and_update(
+        {"_id": id},
+        versioned({}, deleted_at="$$NOW"),
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    raw = None
+    try:
+        raw = await delete_by_id(document_type, id, expected_revision, session)
+    finally:
+        if raw is None:
+            await tombstones.delete_one({"_id": id, "version": tombstone["version"]}, session=session)
+    return (raw, tombstone["version"]) if raw is not None else (None, None)
+
+
+async def exists(document_type: Type[Document], id: PyObjectId) -> bool:
+    return await document_type.get_motor_collection().count_documents({"_id": id}, limit=1) > 0
@@ -1,8 +1,44 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name, ReadPreference
 from decouple import config
 
+from src.dataaccess.profiling import slow_query_log, slow_query_log_enabled
+
 database_url = config("DEVELOPMENT_DATABASE_URL")
 database = config("DEVELOPMENT_DATABASE")
+min_pool_size = config("DATABASE_MIN_POOL_SIZE", default=4, cast=int)
+max_pool_size = config("DATABASE_MAX_POOL_SIZE", default=100, cast=int)
+# Read preference for the read only endpoints, e.g. secondaryPreferred.
+# Writes and authentication always go to the primary.
+read_preference_mode = config("DATABASE_READ_PREFERENCE", default="primary")
+max_staleness_seconds = config("DATABASE_MAX_STALENESS_SECONDS", default=-1, cast=int)
+
+
+def build_read_preference(mode: str, max_staleness: int = -1):
+    mode_id = read_pref_mode_from_name(mode)
+    if mode_id == ReadPreference.PRIMARY.mode:
+        return ReadPreference.PRIMARY
+    return make_read_preference(mode_id, None, max_staleness)
 
-motor_client: AsyncIOMotorClient = AsyncIOMotorClient(database_url)
+
+motor_client: AsyncIOMotorClient = AsyncIOMotorClient(
+    database_url,
+    minPoolSize=min_pool_size,
+    maxPoolSize=max_pool_size,
+    event_listeners=[slow_query_log] if slow_query_log_enabled else []
+)
+# explains of slow queries run on the driver's synchronous client
+slow_query_log.client = motor_client.delegate
 db: AsyncIOMotorDatabase = motor_client[database]
+read_db: AsyncIOMotorDatabase = motor_client.get_database(
+    database,
+    read_preference=build_read_preference(read_preference_mode, max_staleness_seconds)
+)
+
+
+def read_collection(document_type) -> AsyncIOMotorCollection:
+    """
+    Collection of a beanie document bound to the read database, for
+    queries that can be served by a secondary.
+    """
+    return read_db[document_type.get_motor_collection().name]
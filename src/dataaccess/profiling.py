@@ -0,0 +1,176 @@
+"""
+Slow query log. A pymongo command listener records every command slower
+than a threshold, grouped by the shape of its query (the filter with the
+values taken out), and runs an explain the first time a shape shows up,
+so we can tell which filter is doing a collection scan.
+"""
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from decouple import config
+from pymongo import monitoring
+
+MONITORED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Parts of a command that belong to the session or the connection, not the query
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def query_shape(value: Any) -> Any:
+    """
+    Replaces every value in a query by '?', keeping field names and
+    operators, so queries that only differ in their values group together.
+    """
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [query_shape(v) for v in value]
+    return "?"
+
+
+def _command_query(command_name: str, command: dict) -> dict:
+    if command_name == "aggregate":
+        return {"pipeline": command.get("pipeline", [])}
+    if command_name in ("update", "delete"):
+        statements = command.get("updates") or command.get("deletes") or []
+        return {"q": statements[0].get("q", {}) if statements else {}}
+    query = {"filter": command.get("filter", command.get("query", {}))}
+    if command.get("sort"):
+        query["sort"] = command["sort"]
+    return query
+
+
+def _summarize_plan(plan: dict) -> str:
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+class _Shape:
+    def __init__(self, command: str, collection: str, shape: dict, samples: int):
+        self.command = command
+        self.collection = collection
+        self.shape = shape
+        self.count = 0
+        self.durations = deque(maxlen=samples)
+        self.docs_returned = 0
+        self.last_seen: Optional[datetime] = None
+        self.explain: Optional[dict] = None
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100, max_shapes: int = 200, samples_per_shape: int = 500):
+        self.threshold_micros = threshold_ms * 1000
+        self.max_shapes = max_shapes
+        self.samples_per_shape = samples_per_shape
+        # Synchronous client used to run the explains
+        self.client = None
+        self._started: Dict[tuple, tuple] = {}
+        self._shapes: "OrderedDict[str, _Shape]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in MONITORED_COMMANDS:
+            self._started[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None or event.duration_micros < self.threshold_micros:
+            return
+        database, command = started
+        self._record(database, event.command_name, command, event.duration_micros / 1000, event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._started.pop((event.connection_id, event.request_id), None)
+
+    def _record(self, database: str, command_name: str, command: dict, duration_ms: float, reply: dict):
+        collection = str(command.get(command_name))
+        shape = query_shape(_command_query(command_name, command))
+        key = f"{database}.{collection}:{command_name}:{shape}"
+        cursor = reply.get("cursor") or {}
+        returned = len(cursor.get("firstBatch", [])) if cursor else reply.get("n", 0)
+
+        with self._lock:
+            entry = self._shapes.get(key)
+            new_shape = entry is None
+            if new_shape:
+                entry = _Shape(command_name, collection, shape, self.samples_per_shape)
+                self._shapes[key] = entry
+                if len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(key)
+            entry.count += 1
+            entry.durations.append(duration_ms)
+            entry.docs_returned += returned
+            entry.last_seen = datetime.utcnow()
+
+        if new_shape and self.client is not None:
+            self._explainer.submit(self._explain, entry, database, command_name, command)
+
+    def _explain(self, entry: _Shape, database: str, command_name: str, command: dict):
+        explained = {k: v for k, v in command.items() if not k.startswith("$") and k not in _DRIVER_FIELDS}
+        try:
+            result = self.client[database].command(
+                {"explain": explained, "verbosity": "executionStats"}
+            )
+        except Exception as e:
+            entry.explain = {"error": str(e)}
+            return
+        stats = result.get("executionStats", {})
+        planner = result.get("queryPlanner", {})
+        # aggregations nest the plan of their $cursor stage
+        if not planner and result.get("stages"):
+            cursor_stage = result["stages"][0].get("$cursor", {})
+            planner = cursor_stage.get("queryPlanner", {})
+            stats = cursor_stage.get("executionStats", {})
+        entry.explain = {
+            "plan": _summarize_plan(planner.get("winningPlan", {})),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_returned": stats.get("nReturned"),
+            "explained_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    def _percentile(ordered: List[float], p: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def report(self, top: int = 50) -> List[dict]:
+        with self._lock:
+            shapes = [(entry, sorted(entry.durations)) for entry in self._shapes.values()]
+        result = []
+        for entry, ordered in shapes:
+            result.append({
+                "command": entry.command,
+                "collection": entry.collection,
+                "shape": entry.shape,
+                "count": entry.count,
+                "p50_ms": self._percentile(ordered, 50),
+                "p95_ms": self._percentile(ordered, 95),
+                "p99_ms": self._percentile(ordered, 99),
+                "max_ms": ordered[-1] if ordered else 0.0,
+                "avg_docs_returned": entry.docs_returned / entry.count if entry.count else 0,
+                "last_seen": entry.last_seen,
+                "explain": entry.explain,
+            })
+        result.sort(key=lambda r: r["count"] * r["p50_ms"], reverse=True)
+        return result[:top]
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+
+
+slow_query_log_enabled = config("SLOW_QUERY_LOG_ENABLED", default=False, cast=bool)
+slow_query_log = SlowQueryLog(threshold_ms=config("SLOW_QUERY_THRESHOLD_MS", default=100, cast=float))
@@ -0,0 +1,32 @@
+"""
+Read only queries that may be served by a secondary, according to the
+configured read preference (see database.py).
+These are lean reads: rows come straight from the driver as dicts and
+are mapped to their response shape by a row function, without building
+a beanie Document (and validating it) for each of them.
+"""
+from typing import Callable, List, Optional, Tuple, Type
+
+from beanie import Document
+from motor.motor_asyncio import AsyncIOMotorClientSession
+
+
+async def find_rows(
+        document_type: Type[Document],
+        filters: dict,
+        row: Callable[[dict], dict],
+        projection: Optional[dict] = None,
+        skip: int = 0,
+        limit: int = 0,
+        session: Optional[AsyncIOMotorClientSession] = None
+) -> Tuple[List[dict], int]:
+    """
+    Returns a page of rows matching filters, each one mapped with `row`,
+    and the total count of matching documents.
+    """
+    from src.dataaccess.database import read_collection
+    collection = read_collection(document_type)
+    cursor = collection.find(filters, projection, skip=skip, limit=limit, session=session)
+    rows = [row(raw) async for raw in cursor]
+    total = await collection.count_documents(filters, session=session)
+    return rows, total
@@ -0,0 +1,57 @@
+"""
+Causally consistent sessions across requests. A write returns the
+cluster and operation time it happened at as an opaque token; a read
+that sends the token back waits until the member serving it (maybe a
+secondary) has caught up with that write, so clients read their own
+writes even when reads are routed away from the primary.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from contextlib import asynccontextmanager
+from typing import Mapping, Optional
+
+import bson
+from bson import Timestamp
+from motor.motor_asyncio import AsyncIOMotorClientSession
+
+CAUSAL_TOKEN_HEADER = "X-Causal-Token"
+
+
+def dump_causal_token(session: AsyncIOMotorClientSession) -> Optional[str]:
+    # Standalone servers do not report operation times
+    if session.operation_time is None:
+        return None
+    document = {"operationTime": session.operation_time, "clusterTime": session.cluster_time}
+    return urlsafe_b64encode(bson.encode(document)).decode()
+
+
+def load_causal_token(token: Optional[str]) -> Optional[dict]:
+    """
+    Times carried by a token, None if the token is not one we issued. A
+    malformed token only costs the read-your-writes guarantee.
+    """
+    if not token:
+        return None
+    try:
+        times = bson.decode(urlsafe_b64decode(token.encode()))
+    except Exception:
+        return None
+    if not isinstance(times.get("operationTime"), Timestamp):
+        return None
+    cluster_time = times.get("clusterTime")
+    if cluster_time is not None and not (
+            isinstance(cluster_time, Mapping) and isinstance(cluster_time.get("clusterTime"), Timestamp)
+    ):
+        return None
+    return times
+
+
+@asynccontextmanager
+async def causal_session(token: Optional[str] = None):
+    from src.dataaccess.database import motor_client
+    async with await motor_client.start_session(causal_consistency=True) as session:
+        times = load_causal_token(token)
+        if times is not None:
+            if times.get("clusterTime") is not None:
+                session.advance_cluster_time(times["clusterTime"])
+            session.advance_operation_time(times["operationTime"])
+        yield session
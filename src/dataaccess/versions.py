@@ -0,0 +1,113 @@
+"""
+Change versions, used to let clients fetch only what changed in a
+collection since the last version they saw. The version of a document
+is the time of the database server (in ms since the epoch) when it was
+last written, set by the write itself in a pipeline update, so there is
+no shared counter to go through and no extra round trip.
+"""
+import heapq
+from datetime import timezone
+from itertools import islice
+from typing import List, Optional, Tuple
+
+from decouple import config
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from src.dtos.models import PyObjectId
+
+# Aggregation expression of the version of a write
+VERSION_NOW = {"$toLong": "$$NOW"}
+
+
+def versioned(data: dict, **expressions) -> List[dict]:
+    """
+    Pipeline update that sets `data` as is (values are not expressions
+    in a pipeline) along with `expressions`, and stamps the version
+    """
+    fields = {key: {"$literal": value} for key, value in data.items()}
+    return [{"$set": {**fields, **expressions, "version": VERSION_NOW}}]
+
+
+def changed_after(since: int, after: Optional[PyObjectId], until: int) -> dict:
+    """
+    Filter of the documents after the (version, id) position of a sync,
+    up to version `until`
+    """
+    newer = {"version": {"$gt": since, "$lte": until}}
+    if after is not None:
+        return {"$or": [newer, {"version": since, "_id": {"$gt": after}}]}
+    if since == 0:
+        # a full sync takes the documents of version 0 too
+        return {"version": {"$gte": 0, "$lte": until}}
+    return newer
+
+
+async def find_changes(
+        collection: AsyncIOMotorCollection,
+        since: int,
+        after: Optional[PyObjectId],
+        until: int,
+        limit: int,
+        projection: Optional[dict] = None
+) -> List[dict]:
+    """
+    Raw documents changed after the position of a sync, in (version, id)
+    order. Needs the (version, _id) index of the collection
+    """
+    cursor = collection.find(changed_after(since, after, until), projection)
+    return await cursor.sort([("version", 1), ("_id", 1)]).limit(limit).to_list(None)
+
+
+def merge_changes(upserts: List[dict], deletes: List[dict], limit: int) -> Tuple[List[Tuple[dict, bool]], bool]:
+    """
+    First `limit` changes of both (version, id) ordered lists, in that
+    order and flagged as deletes or not, and whether there are more
+    """
+    changes = heapq.merge(
+        ((raw, False) for raw in upserts),
+        ((raw, True) for raw in deletes),
+        key=lambda change: (change[0]["version"], change[0]["_id"])
+    )
+    page = list(islice(changes, limit + 1))
+    return page[:limit], len(page) > limit
+
+
+async def backfill(collection: AsyncIOMotorCollection):
+    """
+    Gives version 0 to the documents written before change versions
+    existed, so full syncs page through them too
+    """
+    await collection.update_many({"version": None}, {"$set": {"version": 0}})
+
+
+class ChangeVersions:
+    """
+    A write takes its version before it lands, so a client could sync
+    past a write still in progress. The high-water mark stays
+    `settle_seconds` behind the server clock to give writes in progress
+    the time to land.
+    """
+
+    def __init__(self, settle_seconds: float = 5):
+        self.settle_ms = int(settle_seconds * 1000)
+
+    @staticmethod
+    async def server_time() -> int:
+        """
+        Time of the database server in ms since the epoch, the clock
+        versions come from
+        """
+        from src.dataaccess.database import db
+        local_time = (await db.command("isMaster"))["localTime"]
+        return int(local_time.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+    async def high_water_mark(self) -> int:
+        """
+        Highest version a client can safely sync up to
+        """
+        return await self.server_time() - self.settle_ms
+
+
+nomenclature_versions = ChangeVersions(
+    settle_seconds=config("CHANGE_VERSION_SETTLE_SECONDS", default=5, cast=float)
+)
@@ -1,7 +1,10 @@
-from typing import Optional
+from typing import Optional, Type
 
-from fastapi import Query
+from beanie import Document
+from fastapi import Query, Header, HTTPException, status, Response as HTTPResponse
 
+from src.dataaccess.commands import exists
+from src.dataaccess.sessions import causal_session, dump_causal_token, CAUSAL_TOKEN_HEADER
 from src.dtos.models import PyObjectId, Nomenclature, User
 
 
@@ -31,3 +34,59 @@ async def get_nomenclature(id: PyObjectId):
 
 async def get_user_from_request(id: PyObjectId):
     return await User.get(id)
+
+
+def get_expected_revision(if_match: Optional[str] = Header(None)) -> Optional[int]:
+    """
+    Reads the revision the client expects to modify from the If-Match
+    header. Accepts both strong ("3") and weak (W/"3") tags, '*' or a
+    missing header means the write is unconditional.
+    """
+    if if_match is None or if_match.strip() == '*':
+        return None
+    tag = if_match.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="If-Match must be the ETag of the resource"
+        )
+
+
+def etag(revision: int) -> str:
+    return f'"{revision}"'
+
+
+async def raise_on_conflict(document_type: Type[Document], id: PyObjectId, expected_revision: Optional[int]):
+    """
+    Called when a conditional write did not match any document: if the
+    document still exists it was modified by someone else in between.
+    """
+    if expected_revision is not None and await exists(document_type, id):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="The resource was modified by another request"
+        )
+
+
+async def get_read_session(causal_token: Optional[str] = Header(None, alias=CAUSAL_TOKEN_HEADER)):
+    """
+    Causally consistent session for reads. Sending back the token
+    returned by a previous write guarantees the read observes it.
+    """
+    async with causal_session(causal_token) as session:
+        yield session
+
+
+async def get_write_session():
+    async with causal_session() as session:
+        yield session
+
+
+def set_causal_token(response: HTTPResponse, session):
+    token = dump_causal_token(session)
+    if token is not None:
+        response.headers[CAUSAL_TOKEN_HEADER] = token
@@ -0,0 +1,100 @@
+"""
+MessagePack encoding of the API payloads, as an alternative to JSON for
+clients that send `Accept: application/msgpack`. ObjectIds and datetimes
+travel as extension types instead of strings. msgpack is an optional
+dependency: without it every response is JSON and msgpack bodies get a 415.
+"""
+import json
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any
+
+from bson import ObjectId
+from starlette.responses import Response
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+# Application extension types; datetimes use the msgpack timestamp type (-1)
+EXT_OBJECT_ID = 1
+
+# Media type negotiated for the response of the request being served
+response_media_type: ContextVar[str] = ContextVar("response_media_type", default=JSON_MEDIA_TYPE)
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return msgpack.ExtType(EXT_OBJECT_ID, value.binary)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            # stored datetimes are naive UTC
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    raise TypeError(f"Can not encode {type(value).__name__} as msgpack")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == EXT_OBJECT_ID:
+        return ObjectId(data)
+    return msgpack.ExtType(code, data)
+
+
+def packb(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True, datetime=False)
+
+
+def unpackb(data: bytes) -> Any:
+    return msgpack.unpackb(data, ext_hook=_ext_hook, timestamp=3, raw=False)
+
+
+def is_msgpack(content_type: str) -> bool:
+    return content_type.split(";", 1)[0].strip().lower() in MSGPACK_MEDIA_TYPES
+
+
+def negotiate(accept: str) -> str:
+    """
+    Picks msgpack or JSON for an Accept header. msgpack has to be asked
+    for explicitly, and wins only if it is not ranked below JSON.
+    """
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+    msgpack_q = json_q = 0.0
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = media_type.lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return MSGPACK_MEDIA_TYPE if msgpack_q > 0 and msgpack_q >= json_q else JSON_MEDIA_TYPE
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return packb(content)
+
+
+def render(content: Any, status_code: int = 200) -> Response:
+    """
+    Renders content in the media type negotiated for the current request.
+    Values JSON does not know (ObjectIds, datetimes) are sent as strings.
+    """
+    if response_media_type.get() == MSGPACK_MEDIA_TYPE:
+        return MsgPackResponse(content, status_code=status_code)
+    body = json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":"))
+    return Response(body, status_code=status_code, media_type=JSON_MEDIA_TYPE)
@@ -1,5 +1,6 @@
 from beanie import Document, PydanticObjectId
 from pydantic import BaseModel
+from pymongo import IndexModel
 from typing import Optional, List, Union
 from src.inmutables import NomenclatureType
 import datetime
@@ -59,15 +60,27 @@ class User(Document):
     disabled: Optional[bool] = None
     scopes: List[str] = []
     roles: List[Role] = []
+    revision: int = 0
 
     class Collection:
         name = 'users'
 
     def is_in_role(self, role: str):
-        return any(role == r.name for r in self.roles)
+        """
+        Whether the user has the role, directly or through inheritance
+        """
+        from src.services.policy import policy
+        return bool(policy.role_mask(tuple(r.name for r in self.roles)) & policy.role_bits.get(role, 0))
 
     def has_permission(self, permission: str):
-        return any(p == permission for p in self.scopes)
+        """
+        Whether the user holds the scope, which may be a wildcard such
+        as 'nomenclature:*', on its own or through its roles
+        """
+        from src.services.policy import policy
+        required = policy.scope_mask((permission,))
+        granted = policy.grants(self.scopes, [r.name for r in self.roles])
+        return bool(required) and policy.satisfies(granted, required)
 
     @property
     def is_admin(self):
@@ -83,7 +96,19 @@ SCOPES = {
     "nomenclature:delete": "Permission to delete nomenclatures",
     "publication-project:read": "Permission to read publication projects",
     "publication-project:write": "Permission to write changes to publication projects",
-    "publication-project:commit": "Permission to make changes as commits over publication projects"
+    "publication-project:commit": "Permission to make changes as commits over publication projects",
+    "diagnostics:read": "Permission to read runtime diagnostics of the server"
+}
+# Bits are assigned in order (see src/services/policy.py): add new scopes
+# at the end of SCOPES
+
+# Scopes each role grants, wildcards allowed, and the roles it inherits.
+# Roles grant nothing on their own for now: users get exactly the scopes
+# stored in their `scopes`, as before. Granting scopes to a role widens the
+# permissions of every user with that role at their next login.
+ROLES = {
+    "User": {"scopes": []},
+    "Admin": {"scopes": []},
 }
 
 
@@ -98,9 +123,14 @@ class Nomenclature(Document):
     pattern: Optional[str] = None
     description: Optional[str] = None
     level: Optional[int] = None
+    revision: int = 0
+    # Change version, see src/dataaccess/versions.py
+    version: int = 0
 
     class Collection:
         name = "nomenclature"
+        # position of a delta sync
+        indexes = [IndexModel([("version", 1), ("_id", 1)])]
 
     @property
     def has_level(self):
@@ -113,4 +143,20 @@ class Nomenclature(Document):
     class Config(BaseConfig):
         pass
 
+
+class NomenclatureTombstone(Document):
+    """
+    Record of a deleted nomenclature, so clients syncing changes learn
+    about the deletion. The id is the id of the deleted nomenclature.
+    """
+    version: int
+    deleted_at: datetime.datetime
+
+    class Collection:
+        name = "nomenclature_tombstones"
+        indexes = [IndexModel([("version", 1), ("_id", 1)])]
+
+    class Config(BaseConfig):
+        pass
+
 # ==================================================================================================
@@ -1,8 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, TypeVar, Generic, Sequence
+from datetime import datetime
+from typing import Optional, List, TypeVar, Generic, Sequence, Dict, Any
 
 from pydantic.generics import GenericModel
+from starlette.responses import Response as HTTPResponse
 
+from .encoding import render
 from .models import Role, PyObjectId, BaseConfig
 from src.inmutables import NomenclatureType
 
@@ -23,6 +26,24 @@ class UserAdminViewModel(LoggedUser):
     id: PyObjectId = Field(default_factory=PyObjectId, alias='_id')
     scopes: List[str] = []
     roles: List[Role] = []
+    revision: int = 0
+
+
+# Lean read rows: what UserAdminViewModel renders, built straight from the
+# stored document. Keep them in sync with the view model.
+USER_ADMIN_PROJECTION = {"username": 1, "scopes": 1, "roles": 1, "email": 1, "full_name": 1, "revision": 1}
+
+
+def user_admin_row(raw: dict) -> dict:
+    return {
+        "_id": raw["_id"],
+        "username": raw["username"],
+        "scopes": raw.get("scopes", []),
+        "roles": [{"name": role["name"]} for role in raw.get("roles", [])],
+        "email": raw.get("email"),
+        "full_name": raw.get("full_name"),
+        "revision": raw.get("revision", 0),
+    }
 
 
 class CreatedUserAdminViewModel(BaseModel):
@@ -75,6 +96,44 @@ class NomenclatureViewModel(BaseModel):
     pattern: Optional[str] = None
     description: Optional[str] = None
     level: Optional[int] = None
+    revision: int = 0
+    version: int = 0
+
+    class Config(BaseConfig):
+        pass
+
+
+# Lean read rows: what NomenclatureViewModel renders, built straight from
+# the stored document (the id stays an ObjectId until the response is
+# encoded). Keep them in sync with the view model.
+NOMENCLATURE_PROJECTION = {
+    "Name": 1, "type": 1, "pattern": 1, "description": 1, "level": 1, "revision": 1, "version": 1
+}
+
+
+def nomenclature_row(raw: dict) -> dict:
+    nomenclature_type = raw["type"]
+    return {
+        "_id": raw["_id"],
+        "Name": raw["Name"],
+        "has_level": nomenclature_type == NomenclatureType.type_check_item.value,
+        "has_pattern": nomenclature_type == NomenclatureType.data_type.value,
+        "type": nomenclature_type,
+        "pattern": raw.get("pattern"),
+        "description": raw.get("description"),
+        "level": raw.get("level"),
+        "revision": raw.get("revision", 0),
+        "version": raw.get("version", 0),
+    }
+
+
+class NomenclatureChangesViewModel(BaseModel):
+    since: int = Field(description="Version the changes were requested from")
+    version: int = Field(description="Version to send as 'since' on the next sync")
+    after: Optional[PyObjectId] = Field(None, description="Id to send as 'after' on the next sync")
+    more: bool = Field(False, description="Whether there are more changes up to now, fetch them right away")
+    upserts: List[NomenclatureViewModel] = []
+    deletes: List[PyObjectId] = []
 
     class Config(BaseConfig):
         pass
@@ -106,6 +165,19 @@ class Page(GenericModel, Generic[T]):
         orm_mode = True
 
 
+def page_response(rows: List[dict], total: int) -> HTTPResponse:
+    """
+    Renders a Response[Page[...]] of lean rows, as JSON or msgpack. The rows
+    already have the shape of the view model, so the response model
+    validation is skipped.
+    """
+    return render({
+        "data": {"items": rows, "records": len(rows), "total": total},
+        "message": "Success",
+        "status_code": 200,
+    })
+
+
 class NomenclatureTypeViewModel(BaseModel):
     label: str
     value: str
@@ -115,3 +187,86 @@ class NomenclatureTypeViewModel(BaseModel):
     class Config:
         orm_mode = True
 # =================================================================================== #
+
+# ===============================    HEALTH    ====================================== #
+
+class ReadinessViewModel(BaseModel):
+    ready: bool
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    mongo_latency_ms: Optional[float] = None
+    steps: Dict[str, Dict[str, Any]] = {}
+
+
+# ===============================    DIAGNOSTICS    ================================= #
+
+class BlockingSiteViewModel(BaseModel):
+    route: str
+    site: str
+    count: int
+    max_lag_ms: float
+    stack: List[str] = []
+
+
+class LoopLagViewModel(BaseModel):
+    enabled: bool
+    threshold_ms: float
+    samples: int
+    max_lag_ms: float
+    histogram: Dict[str, int]
+    blocking_sites: List[BlockingSiteViewModel] = []
+
+
+class CoalescedRouteViewModel(BaseModel):
+    route: str
+    executed: int
+    collapsed: int
+
+
+class CoalescingViewModel(BaseModel):
+    in_flight: int
+    routes: List[CoalescedRouteViewModel] = []
+
+
+class EventHubViewModel(BaseModel):
+    subscribers: int
+    buffered: int
+    published: int
+    dropped: int
+
+
+class AdmissionClassViewModel(BaseModel):
+    name: str
+    limit: int
+    queue_size: int
+    deadline_ms: float
+    active: int
+    waiting: int
+    admitted: int
+    queued: int
+    shed: int
+
+
+class QueryPlanViewModel(BaseModel):
+    plan: Optional[str] = None
+    docs_examined: Optional[int] = None
+    keys_examined: Optional[int] = None
+    docs_returned: Optional[int] = None
+    explained_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class SlowQueryShapeViewModel(BaseModel):
+    command: str
+    collection: str
+    shape: Dict[str, Any]
+    count: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    avg_docs_returned: float
+    last_seen: Optional[datetime] = None
+    explain: Optional[QueryPlanViewModel] = None
+
+# =================================================================================== #
@@ -1,7 +1,12 @@
 from beanie import init_beanie
 from fastapi import FastAPI
-from src.controllers import health, account, user, nomenclature
+from src.controllers import health, account, user, nomenclature, diagnostics, wellknown
 from src.config import config
+from src.dataaccess.sessions import CAUSAL_TOKEN_HEADER
+from src.services.events import change_stream_source, events_source
+from src.services.policy import policy
+from src.services.admission import admission_controller, admission_enabled, AdmissionControlMiddleware
+from src.services.watchdog import loop_watchdog, watchdog_enabled, LoopWatchdogMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 origins = ['*']
@@ -14,21 +19,58 @@ api = FastAPI(docs_url="/api/v1/admin/swag-docs",
               contact={
                   'name': "NextX Team"
               })
+if admission_enabled:
+    # Added before CORS, so shed responses still carry the CORS headers
+    api.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
 api.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=['*'],
-                   allow_headers=['*'])
+                   allow_headers=['*'], expose_headers=['ETag', 'Retry-After', CAUSAL_TOKEN_HEADER])
 api.include_router(health.router, prefix='/api/v1/admin')
 api.include_router(account.router, prefix='/api/v1/admin')
 api.include_router(user.router, prefix='/api/v1/admin')
 api.include_router(nomenclature.router, prefix='/api/v1/admin')
+api.include_router(diagnostics.router, prefix='/api/v1/admin')
+# JWKS goes on the root of the host, where verifiers expect it
+api.include_router(wellknown.router)
+# A route that requires an unknown scope fails here, not on its first request
+policy.compile_routes(api.routes)
+
+if watchdog_enabled:
+    api.add_middleware(LoopWatchdogMiddleware, watchdog=loop_watchdog)
 
 
 @api.on_event("startup")
 async def setup():
     config()
+    if watchdog_enabled:
+        loop_watchdog.start()
     from src.dataaccess.database import db
     from src.dtos.models import User
-    from src.dtos.models import Nomenclature
+    from src.dtos.models import Nomenclature, NomenclatureTombstone
     await init_beanie(db, document_models=[
         User,
-        Nomenclature
+        Nomenclature,
+        NomenclatureTombstone
     ])
+    from src.dataaccess.versions import backfill
+    await backfill(Nomenclature.get_motor_collection())
+    from src.services.search import nomenclature_index, index_reload_seconds
+    if events_source == "change_stream":
+        # Started first, so the writes made while loading are not missed
+        change_stream_source.listeners.append(nomenclature_index.apply)
+        change_stream_source.start()
+    await nomenclature_index.load()
+    if events_source == "local" and index_reload_seconds:
+        nomenclature_index.start_reloading(index_reload_seconds)
+    from src.services.warmup import warmup_state
+    warmup_state.start(api)
+
+
+@api.on_event("shutdown")
+async def teardown():
+    from src.services.search import nomenclature_index
+    from src.services.warmup import warmup_state
+    await warmup_state.stop()
+    await change_stream_source.stop()
+    await nomenclature_index.stop_reloading()
+    if loop_watchdog.running:
+        await loop_watchdog.stop()
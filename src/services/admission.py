@@ -0,0 +1,214 @@
+"""
+Admission control. Requests are split in classes (authentication,
+catalog reads, writes...) and each class has its own concurrency limit
+and a bounded wait queue. A request that finds the queue full, or that
+waits longer than the class deadline, is shed right away with a 503 and
+a Retry-After header instead of piling up until every client times out.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from decouple import config
+
+API_PREFIX = "/api/v1/admin"
+# Long-lived streams would hold a slot for as long as the client listens
+EXEMPT_PATHS = (f"{API_PREFIX}/health", "/.well-known", f"{API_PREFIX}/nomenclature/events")
+AUTH_PATHS = (f"{API_PREFIX}/account/token", f"{API_PREFIX}/account/refresh_token")
+READ_METHODS = ("GET", "HEAD")
+
+# Waiters with a lower value are admitted first
+PRIORITY_AUTHENTICATED_READ, PRIORITY_DEFAULT = 0, 1
+
+
+@lru_cache(maxsize=4096)
+def _verified_token(token: str) -> Optional[dict]:
+    """
+    Payload of an access token with a valid signature, None otherwise.
+    Cached, so a client pays for the signature check once per token
+    """
+    from src.services.crypto import CryptoService
+    try:
+        return CryptoService.decode_token(token)
+    except Exception:
+        return None
+
+
+class AdmissionClass:
+    def __init__(self, name: str, limit: int, queue_size: int, deadline_ms: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.deadline = deadline_ms / 1000
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self._pending = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def waiting(self):
+        return self._pending
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> bool:
+        """
+        Waits for a free slot. Returns False if the request must be shed.
+        """
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if self.waiting >= self.queue_size:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self.queued += 1
+        self._pending += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.deadline)
+        except asyncio.CancelledError:
+            # The request went away, give back the slot if we got it
+            if waiter.done():
+                self.release()
+            raise
+        finally:
+            self._pending -= 1
+            if not waiter.done():
+                waiter.cancel()
+        if waiter.cancelled():
+            self.shed += 1
+            return False
+        # The slot was handed over by release()
+        self.admitted += 1
+        return True
+
+    def release(self):
+        while self._waiters:
+            *_, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                # Hand the slot over, active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def report(self) -> dict:
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "deadline_ms": self.deadline * 1000,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+
+def _admission_class(name: str, limit: int, queue_size: int, deadline_ms: float) -> AdmissionClass:
+    prefix = f"ADMISSION_{name.upper()}"
+    return AdmissionClass(
+        name,
+        limit=config(f"{prefix}_LIMIT", default=limit, cast=int),
+        queue_size=config(f"{prefix}_QUEUE", default=queue_size, cast=int),
+        deadline_ms=config(f"{prefix}_DEADLINE_MS", default=deadline_ms, cast=float),
+    )
+
+
+class AdmissionController:
+    def __init__(self, classes: Dict[str, AdmissionClass]):
+        self.classes = classes
+
+    @staticmethod
+    def classify(scope) -> Optional[str]:
+        """
+        Admission class of a request, None if it is always admitted
+        """
+        path, method = scope["path"], scope["method"]
+        if method == "OPTIONS" or path.startswith(EXEMPT_PATHS):
+            return None
+        if path.startswith(AUTH_PATHS):
+            return "auth"
+        if method not in READ_METHODS:
+            return "writes"
+        if path.startswith(f"{API_PREFIX}/nomenclature"):
+            return "catalog"
+        return "default"
+
+    @staticmethod
+    def priority(scope) -> int:
+        """
+        Reads with a valid, unexpired access token go first. Anything else
+        (no token, a forged or an expired one) waits in line
+        """
+        if scope["method"] not in READ_METHODS:
+            return PRIORITY_DEFAULT
+        for name, value in scope.get("headers", []):
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                token = value[7:].decode("latin-1")
+                payload = _verified_token(token)
+                if payload is None or payload.get("exp", math.inf) <= time.time():
+                    return PRIORITY_DEFAULT
+                # spares the handler decoding it again (see decode_request_token)
+                scope.setdefault("state", {})["access_token"] = (token, payload)
+                return PRIORITY_AUTHENTICATED_READ
+        return PRIORITY_DEFAULT
+
+    def report(self) -> List[dict]:
+        return [c.report() for c in self.classes.values()]
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        name = self.controller.classify(scope) if scope["type"] == "http" else None
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        admission = self.controller.classes[name]
+        if not await admission.acquire(self.controller.priority(scope)):
+            return await self._shed(admission, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release()
+
+    @staticmethod
+    async def _shed(admission: AdmissionClass, send):
+        body = json.dumps({
+            "data": None,
+            "message": "Server is overloaded, retry later",
+            "status_code": 503
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(admission.deadline))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+admission_enabled = config("ADMISSION_CONTROL_ENABLED", default=False, cast=bool)
+admission_controller = AdmissionController({
+    # bcrypt bound, keep it close to the number of cores
+    "auth": _admission_class("auth", limit=8, queue_size=32, deadline_ms=2000),
+    "catalog": _admission_class("catalog", limit=64, queue_size=256, deadline_ms=1000),
+    "writes": _admission_class("writes", limit=16, queue_size=64, deadline_ms=2000),
+    "default": _admission_class("default", limit=32, queue_size=128, deadline_ms=2000),
+})
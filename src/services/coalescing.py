@@ -0,0 +1,103 @@
+"""
+Single-flight request coalescing. Concurrent identical requests to an
+idempotent endpoint share a single execution of the handler (and its
+database queries), and every caller gets a copy of the same rendered
+response.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.dataaccess.sessions import CAUSAL_TOKEN_HEADER
+
+
+def single_flight(endpoint):
+    """
+    Marks an endpoint as safe to coalesce: its response depends only on
+    the path, the query string and the roles and scopes of the caller.
+    """
+    endpoint.__single_flight__ = True
+    return endpoint
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.executed: Dict[str, int] = defaultdict(int)
+        self.collapsed: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def key_for(request: Request, route: str) -> Optional[Hashable]:
+        """
+        Builds the coalescing key of a request, or None if the request
+        must not be coalesced (e.g. its credentials are not valid, so it
+        has to fail on its own).
+        """
+        from src.services.crypto import CryptoService
+        from src.services.policy import policy
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            payload = CryptoService.decode_request_token(request, token)
+        except Exception:
+            return None
+        scopes = policy.token_mask(payload)
+        if payload.get("sub") is None or scopes is None:
+            return None
+        scope = (tuple(sorted(payload.get("roles", []))), scopes)
+        query = tuple(sorted(request.query_params.multi_items()))
+        return (
+            route,
+            request.url.path,
+            query,
+            scope,
+            request.headers.get("accept", ""),
+            request.headers.get(CAUSAL_TOKEN_HEADER, ""),
+        )
+
+    async def run(self, key: Hashable, route: str, call: Callable[[], Awaitable[Response]]) -> Response:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.collapsed[route] += 1
+            response = await asyncio.shield(future)
+            return self._copy(response)
+
+        self.executed[route] += 1
+        # The handler runs in its own task, so a leader whose client goes
+        # away does not cancel the call the followers are waiting for
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return self._copy(await asyncio.shield(task))
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Mark the error as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _copy(response: Response) -> Response:
+        # Middlewares mutate the headers of the response they send, so
+        # every caller (the leader included) needs its own response object
+        copy = Response(content=response.body, status_code=response.status_code)
+        copy.raw_headers = [(name, value) for name, value in response.raw_headers]
+        return copy
+
+    def report(self) -> dict:
+        routes = sorted(set(self.executed) | set(self.collapsed))
+        return {
+            "in_flight": len(self._inflight),
+            "routes": [
+                {"route": route, "executed": self.executed[route], "collapsed": self.collapsed[route]}
+                for route in routes
+            ],
+        }
+
+
+single_flight_group = SingleFlight()
@@ -1,18 +1,20 @@
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from typing import Optional, List
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from decouple import config
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, status, Depends, Request
 from src.dtos.models import TokenData, SCOPES, User
 from pydantic import ValidationError
 from random import sample, randint
 import string
 
 from src.dtos.viewmodels import LoggedUser
+from src.services.hashing import build_password_context
+from src.services.keys import signing_keys
+from src.services.policy import policy
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = build_password_context()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/admin/account/token", scopes=SCOPES)
 
 
@@ -37,8 +39,13 @@ class CryptoService:
     @staticmethod
     async def authenticate_user(username: str, password: str):
         if (user := await User.find_one(User.username == username)) is not None:
-            if not CryptoService.verify_password(password, user.hashed_password):
+            valid, new_hash = pwd_context.verify_and_update(password, user.hashed_password)
+            if not valid:
                 return False
+            # The stored hash was made with an outdated scheme or cost,
+            # so migrate it now that we know the plain password
+            if new_hash is not None:
+                await user.set({User.hashed_password: new_hash})
             return user
         return False
 
@@ -53,20 +60,45 @@ class CryptoService:
         # to_encode holds our claims. Add an expiration
         # time in there
         to_encode.update({'exp': expire})
+        # Refresh tokens are only ever verified by this API, so they keep
+        # using a shared secret whatever the access token algorithm is
+        if not refresh:
+            return signing_keys.encode(to_encode)
         encoded_jwt = jwt.encode(
             to_encode,
-            config("SECRET_JWT_KEY") if not refresh else config("SECRET_REFRESH_JWT_KEY"),
+            config("SECRET_REFRESH_JWT_KEY"),
             algorithm=jwt.ALGORITHMS.HS256
         )
         return encoded_jwt
 
     @staticmethod
-    def get_scopes_from_refresh(refresh_token):
-        payload = jwt.decode(
-            refresh_token,
+    def decode_token(token: str, refresh: bool = False) -> dict:
+        if not refresh:
+            return signing_keys.decode(token)
+        return jwt.decode(
+            token,
             config("SECRET_REFRESH_JWT_KEY"),
             algorithms=[jwt.ALGORITHMS.HS256]
         )
+
+    @staticmethod
+    def decode_request_token(request: Optional[Request], token: str) -> dict:
+        """
+        Decodes the access token of a request once, however many times
+        the request needs it (coalescing key, authorization, ...)
+        """
+        if request is None:
+            return CryptoService.decode_token(token)
+        decoded = getattr(request.state, "access_token", None)
+        if decoded is not None and decoded[0] == token:
+            return decoded[1]
+        payload = CryptoService.decode_token(token)
+        request.state.access_token = (token, payload)
+        return payload
+
+    @staticmethod
+    def get_scopes_from_refresh(refresh_token):
+        payload = CryptoService.decode_token(refresh_token, refresh=True)
         scopes = payload.get('scopes') or []
         return scopes
 
@@ -78,11 +110,7 @@ class CryptoService:
             headers={"WWW-Authenticate": "Bearer"},
         )
         try:
-            payload = jwt.decode(
-                token,
-                config("SECRET_JWT_KEY") if not refresh else config("SECRET_REFRESH_JWT_KEY"),
-                algorithms=[jwt.ALGORITHMS.HS256]
-            )
+            payload = CryptoService.decode_token(token, refresh)
             # username must come as subject
             username: str = payload.get('sub')
             if username is None:
@@ -100,8 +128,12 @@ class RoleAuth:
     def __init__(self, allowed_roles: List[str] = None):
         super(RoleAuth, self).__init__()
         self.allowed_roles = allowed_roles
+        # Compiled once, a role that is not in ROLES fails on startup
+        self.allowed_mask = policy.allowed_roles_mask(allowed_roles or [])
 
-    async def __call__(self, security_scopes: SecurityScopes, token: str = Depends(oauth2_scheme)):
+    async def __call__(
+            self, security_scopes: SecurityScopes, token: str = Depends(oauth2_scheme), request: Request = None
+    ):
         if security_scopes.scopes:
             authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
         else:
@@ -114,12 +146,15 @@ class RoleAuth:
         )
 
         try:
-            payload = jwt.decode(token, config("SECRET_JWT_KEY"), algorithms=[jwt.ALGORITHMS.HS256])
+            payload = CryptoService.decode_request_token(request, token)
             # username must come as subject
             username: str = payload.get('sub')
             if username is None:
                 raise credentials_exception
-            token_scopes = payload.get('scopes', [])
+            token_scopes = policy.token_mask(payload)
+            # issued with a scope list this policy does not know
+            if token_scopes is None:
+                raise credentials_exception
             token_roles = payload.get('roles', [])
             token_full_name = payload.get('full_name')
             token_email = payload.get('email')
@@ -127,21 +162,20 @@ class RoleAuth:
         except (JWTError, ValidationError):
             raise credentials_exception
 
-        for scope in security_scopes.scopes:
-            if scope not in token_scopes:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Not enough permissions",
-                    headers={"WWW-Authenticate": authenticate_value},
-                )
+        if not policy.satisfies(token_scopes, policy.required_mask(tuple(security_scopes.scopes))):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Not enough permissions",
+                headers={"WWW-Authenticate": authenticate_value},
+            )
 
         # Check the roles
-        if not self.allowed_roles or any(role in self.allowed_roles for role in token_roles):
+        if not self.allowed_roles or policy.role_mask(tuple(token_roles)) & self.allowed_mask:
             # Add to user only the scopes it has been granted permission for
             return LoggedUser(
                 username=username,
                 roles=token_roles,
-                scopes=token_scopes,
+                scopes=list(policy.scope_names(token_scopes)),
                 full_name=token_full_name,
                 email=token_email
             )
@@ -0,0 +1,203 @@
+"""
+Fan-out hub for nomenclature change events, served as Server-Sent Events.
+There is a single upstream source per worker, either the mutation
+handlers of the worker itself ("local") or a Mongo change stream
+("change_stream", needs a replica set and sees the writes of every
+worker), and any number of subscribers, each with a bounded queue.
+
+Event ids are the change versions of the catalog (see versions.py), so a
+client can resume from the Last-Event-ID it got, or fall back to the
+/nomenclature/changes endpoint when the hub no longer has those events.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Optional, Set, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+# Sent instead of the missed events when they are not buffered anymore
+RESET = "reset"
+_CLOSE = object()
+
+
+class Subscriber:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, event) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class EventHub:
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 256, heartbeat_seconds: float = 15):
+        self.buffer: Deque[Tuple[int, str, str]] = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat_seconds
+        self.subscribers: Set[Subscriber] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event: str, version: int, data: dict):
+        message = (version, event, json.dumps(data, default=str))
+        self.buffer.append(message)
+        self.published += 1
+        for subscriber in list(self.subscribers):
+            if not subscriber.offer(message):
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        """
+        A subscriber that can not keep up is disconnected instead of
+        buffering without limit; it resumes from its Last-Event-ID.
+        """
+        self.subscribers.discard(subscriber)
+        self.dropped += 1
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_CLOSE)
+
+    def _missed(self, last_event_id: int):
+        """
+        Buffered events published after the event the client saw last,
+        or None if that event is no longer (or never was) in the buffer.
+        """
+        events = list(self.buffer)
+        for i, (version, *_) in enumerate(events):
+            if version == last_event_id:
+                return events[i + 1:]
+        if not events or last_event_id >= events[-1][0]:
+            return []
+        return None
+
+    @staticmethod
+    def format(version: int, event: str, data: str) -> str:
+        return f"id: {version}\nevent: {event}\ndata: {data}\n\n"
+
+    async def stream(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        # Taken before the first yield: whatever is published from now on
+        # goes to the queue only, so nothing is sent twice
+        missed = self._missed(last_event_id) if last_event_id is not None else []
+        try:
+            # tell the browser how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield self.format(last_event_id, RESET, json.dumps({"since": last_event_id}))
+            else:
+                for message in missed:
+                    yield self.format(*message)
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is _CLOSE:
+                    return
+                yield self.format(*message)
+        finally:
+            self.subscribers.discard(subscriber)
+
+    def report(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "buffered": len(self.buffer),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+class ChangeStreamSource:
+    """
+    Feeds the hub from a change stream over the nomenclature collection,
+    resuming where it left off after errors. Listeners
+    get every change too, e.g. the search index (see search.py).
+    """
+
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+        self.listeners: List[Callable[[str, dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        from src.dataaccess.database import db
+        from src.dtos.models import Nomenclature, NomenclatureTombstone
+        from src.dtos.viewmodels import nomenclature_row
+        nomenclatures = Nomenclature.get_motor_collection()
+        tombstones = NomenclatureTombstone.get_motor_collection()
+        pipeline = [{"$match": {
+            "ns.coll": nomenclatures.name, "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup",
+                                    resume_after=self._resume_token) as changes:
+                    async for change in changes:
+                        self._resume_token = changes.resume_token
+                        if change["operationType"] == "delete":
+                            # the tombstone is written before the delete, and
+                            # holds its version (see delete_with_tombstone)
+                            id = change["documentKey"]["_id"]
+                            tombstone = await tombstones.find_one({"_id": id}, {"version": 1})
+                            version = tombstone["version"] if tombstone else 0
+                            self._dispatch(DELETED, version, {"_id": str(id)})
+                            continue
+                        document = change.get("fullDocument")
+                        if document is None:
+                            # updated and then deleted before the lookup
+                            continue
+                        event = CREATED if change["operationType"] == "insert" else UPDATED
+                        self._dispatch(event, document.get("version", 0), nomenclature_row(document))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Nomenclature change stream failed, resuming")
+                await asyncio.sleep(1)
+
+    def _dispatch(self, event: str, version: int, data: dict):
+        self.hub.publish(event, version, data)
+        for listener in self.listeners:
+            listener(event, data)
+
+
+events_source = config("NOMENCLATURE_EVENTS_SOURCE", default="local")
+nomenclature_events = EventHub(
+    buffer_size=config("NOMENCLATURE_EVENTS_BUFFER", default=1000, cast=int),
+    queue_size=config("NOMENCLATURE_EVENTS_QUEUE", default=256, cast=int),
+    heartbeat_seconds=config("NOMENCLATURE_EVENTS_HEARTBEAT_SECONDS", default=15, cast=float),
+)
+change_stream_source = ChangeStreamSource(nomenclature_events)
+
+
+def publish_local(event: str, version: int, data: dict):
+    """
+    Publishes a change made by this worker, unless the change stream is
+    the source of events (it will see the change on its own).
+    """
+    if events_source == "local":
+        nomenclature_events.publish(event, version, data)
@@ -0,0 +1,96 @@
+"""
+Password hashing policy. The scheme and its cost factor are read from
+the environment so they can be tuned per deployment (see the
+`calibrate-hash` command in console.py) without touching the code.
+"""
+import time
+from typing import Dict, List, Optional
+
+from decouple import config
+from passlib.context import CryptContext
+
+SUPPORTED_SCHEMES = ("bcrypt", "argon2")
+
+# Sensible defaults when the deployment has not been calibrated yet.
+# For bcrypt the cost is the log2 of the rounds, for argon2 it is the
+# time cost (number of passes over memory).
+DEFAULT_COSTS = {"bcrypt": 12, "argon2": 3}
+COST_BOUNDS = {"bcrypt": (4, 31), "argon2": (1, 32)}
+
+
+def build_password_context(
+        scheme: Optional[str] = None,
+        cost: Optional[int] = None,
+        memory_cost: Optional[int] = None
+) -> CryptContext:
+    """
+    Builds the passlib context used to hash and verify passwords.
+    Every supported scheme is kept in the context so hashes created
+    under a previous policy still verify, but only `scheme` with the
+    given `cost` is considered up to date: anything else is flagged by
+    `needs_update` and gets rehashed on the next successful login.
+    """
+    scheme = scheme or config("PASSWORD_HASH_SCHEME", default="bcrypt")
+    if scheme not in SUPPORTED_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme '{scheme}'")
+    if cost is None:
+        cost = config("PASSWORD_HASH_COST", default=DEFAULT_COSTS[scheme], cast=int)
+
+    schemes = [scheme] + [s for s in SUPPORTED_SCHEMES if s != scheme]
+    settings = {
+        f"{scheme}__default_rounds": cost,
+        f"{scheme}__min_rounds": cost,
+        f"{scheme}__max_rounds": cost,
+    }
+    if scheme == "argon2":
+        settings["argon2__memory_cost"] = memory_cost or config(
+            "PASSWORD_HASH_MEMORY_KIB", default=65536, cast=int
+        )
+    context = CryptContext(schemes=schemes, default=scheme, deprecated="auto", **settings)
+    # passlib only looks for the backend on first use, fail now instead
+    if not context.handler(scheme).has_backend():
+        raise RuntimeError(
+            f"Password hash scheme '{scheme}' has no backend installed"
+            + (", install argon2-cffi" if scheme == "argon2" else "")
+        )
+    return context
+
+
+def measure_hash_time(scheme: str, cost: int, samples: int = 3, memory_cost: Optional[int] = None) -> float:
+    """
+    Returns the median time in milliseconds it takes to hash a password
+    with the given scheme and cost on this machine.
+    """
+    context = build_password_context(scheme, cost, memory_cost)
+    # first call loads the hashing backend, keep it out of the numbers
+    context.hash("calibration-password")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def calibrate(
+        scheme: str,
+        target_ms: float,
+        samples: int = 3,
+        memory_cost: Optional[int] = None
+) -> Dict[str, object]:
+    """
+    Benchmarks increasing cost factors for `scheme` until hashing takes
+    longer than `target_ms`, and recommends the highest cost that stays
+    within the target (never lower than the scheme minimum).
+    """
+    low, high = COST_BOUNDS[scheme]
+    results: List[Dict[str, float]] = []
+    recommended = low
+    for cost in range(low, high + 1):
+        elapsed = measure_hash_time(scheme, cost, samples, memory_cost)
+        results.append({"cost": cost, "ms": elapsed})
+        if elapsed > target_ms:
+            break
+        recommended = cost
+    return {"scheme": scheme, "target_ms": target_ms, "recommended": recommended, "results": results}
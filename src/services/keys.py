@@ -0,0 +1,144 @@
+"""
+Signing keys for access tokens. With the default HS256 algorithm tokens
+are signed with SECRET_JWT_KEY as always. With an asymmetric algorithm
+(ES256, RS256) tokens are signed with a private key and carry its `kid`,
+and the public keys are published as a JWKS so other services can verify
+our tokens locally, without sharing a secret or calling this API.
+"""
+import hashlib
+import json
+import os
+from base64 import urlsafe_b64encode
+from typing import Dict, Optional
+
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from decouple import config
+from jose import jwk, jwt, JWTError
+
+ASYMMETRIC_ALGORITHMS = ("ES256", "ES384", "ES512", "RS256", "RS384", "RS512")
+# Members of each key type that identify the key (RFC 7638)
+_THUMBPRINT_MEMBERS = {"EC": ("crv", "kty", "x", "y"), "RSA": ("e", "kty", "n")}
+_CURVE_ALGORITHMS = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}
+
+
+def thumbprint(public_jwk: dict) -> str:
+    members = {k: public_jwk[k] for k in _THUMBPRINT_MEMBERS[public_jwk["kty"]]}
+    digest = hashlib.sha256(json.dumps(members, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+def key_algorithm(public_key_pem: str, algorithm: str) -> str:
+    """
+    Algorithm of a rotated out public key whose algorithm was not given.
+    EC keys are told by their curve. The hash of an RSA key can not be
+    told, so it is taken to be `algorithm` if that is RSA, RS256 otherwise.
+    """
+    key = load_pem_public_key(public_key_pem.encode())
+    if isinstance(key, ec.EllipticCurvePublicKey):
+        if key.curve.name not in _CURVE_ALGORITHMS:
+            raise ValueError(f"Unsupported curve {key.curve.name}")
+        return _CURVE_ALGORITHMS[key.curve.name]
+    return algorithm if algorithm.startswith("RS") else "RS256"
+
+
+def _read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+class KeySet:
+    def __init__(
+            self,
+            algorithm: str,
+            private_key_pem: Optional[str] = None,
+            kid: Optional[str] = None,
+            verification_keys_pem: Optional[Dict[str, str]] = None,
+            verification_algorithms: Optional[Dict[str, str]] = None
+    ):
+        self.algorithm = algorithm
+        self.signing_key = None
+        self.kid = None
+        # kid -> public key, the signing key plus any rotated out key whose
+        # tokens may still be alive
+        self.public_keys = {}
+        # kid -> algorithm of the key, rotated out keys may use another one
+        self.algorithms: Dict[str, str] = {}
+        if not self.asymmetric:
+            return
+
+        if private_key_pem is None:
+            raise ValueError(f"{algorithm} needs a private key, set JWT_PRIVATE_KEY_FILE")
+        self.signing_key = jwk.construct(private_key_pem, algorithm)
+        public_key = self.signing_key.public_key()
+        self.kid = kid or thumbprint(public_key.to_dict())
+        self.public_keys[self.kid] = public_key
+        self.algorithms[self.kid] = algorithm
+        for key_id, pem in (verification_keys_pem or {}).items():
+            if key_id in self.public_keys:
+                continue
+            alg = (verification_algorithms or {}).get(key_id) or key_algorithm(pem, algorithm)
+            self.public_keys[key_id] = jwk.construct(pem, alg)
+            self.algorithms[key_id] = alg
+
+    @property
+    def asymmetric(self):
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def encode(self, claims: dict) -> str:
+        if not self.asymmetric:
+            return jwt.encode(claims, config("SECRET_JWT_KEY"), algorithm=jwt.ALGORITHMS.HS256)
+        return jwt.encode(claims, self.signing_key, algorithm=self.algorithm, headers={"kid": self.kid})
+
+    def decode(self, token: str) -> dict:
+        if not self.asymmetric:
+            return jwt.decode(token, config("SECRET_JWT_KEY"), algorithms=[jwt.ALGORITHMS.HS256])
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid not in self.public_keys:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, self.public_keys[kid], algorithms=[self.algorithms[kid]])
+
+    def jwks(self) -> dict:
+        return {
+            "keys": [
+                {**key.to_dict(), "kid": kid, "use": "sig", "alg": self.algorithms[kid]}
+                for kid, key in self.public_keys.items()
+            ]
+        }
+
+
+def load_key_set() -> KeySet:
+    algorithm = config("JWT_ALGORITHM", default="HS256")
+    if algorithm == "HS256":
+        return KeySet(algorithm)
+    # Fail on startup rather than sign with the shared secret by mistake
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ValueError(
+            f"Unsupported JWT_ALGORITHM {algorithm}, use HS256 or one of {', '.join(ASYMMETRIC_ALGORITHMS)}"
+        )
+
+    # Public keys of rotated out signing keys, named <kid>.pem, or
+    # <kid>.<algorithm>.pem when the algorithm can not be told from the key
+    verification_dir = config("JWT_VERIFICATION_KEYS_DIR", default="")
+    verification_keys, verification_algorithms = {}, {}
+    if verification_dir:
+        for name in sorted(os.listdir(verification_dir)):
+            if not name.endswith(".pem"):
+                continue
+            kid, _, alg = name[:-4].rpartition(".")
+            if alg not in ASYMMETRIC_ALGORITHMS:
+                kid, alg = name[:-4], None
+            verification_keys[kid] = _read(os.path.join(verification_dir, name))
+            if alg is not None:
+                verification_algorithms[kid] = alg
+
+    return KeySet(
+        algorithm,
+        private_key_pem=_read(config("JWT_PRIVATE_KEY_FILE")),
+        kid=config("JWT_KEY_ID", default=None),
+        verification_keys_pem=verification_keys,
+        verification_algorithms=verification_algorithms
+    )
+
+
+signing_keys = load_key_set()
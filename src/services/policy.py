@@ -0,0 +1,167 @@
+"""
+Authorization policy compiled into bitsets. Every scope in SCOPES gets a
+bit and every role in ROLES gets a bit, so checking the scopes of a token
+against the scopes an endpoint requires is a single mask operation,
+however many scopes exist.
+
+Scopes can be granted and required with wildcards: '*' is every scope and
+'nomenclature:*' every scope under 'nomenclature:'. Roles grant scopes and
+inherit the roles (and with them the scopes) they list in 'inherits'.
+
+Access tokens carry the granted scopes as a hex mask ('scm') along with a
+fingerprint of the scope list the bits refer to ('spv'). New scopes must be
+appended to SCOPES: tokens issued before keep their meaning, while
+reordering or removing scopes invalidates them.
+"""
+import hashlib
+from functools import lru_cache
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from src.dtos.models import SCOPES, ROLES
+
+WILDCARD = "*"
+
+
+def _fingerprint(scopes: Sequence[str]) -> str:
+    return hashlib.sha1("\n".join(scopes).encode()).hexdigest()[:8]
+
+
+class Policy:
+    def __init__(self, scopes: Iterable[str], roles: Mapping[str, dict]):
+        self.scopes: Tuple[str, ...] = tuple(scopes)
+        self.scope_bits: Dict[str, int] = {name: 1 << i for i, name in enumerate(self.scopes)}
+        self.all_scopes = (1 << len(self.scopes)) - 1
+        # fingerprint of every prefix of the scope list -> bits it covers
+        self.versions: Dict[str, int] = {
+            _fingerprint(self.scopes[:size]): (1 << size) - 1 for size in range(len(self.scopes) + 1)
+        }
+        self.version = _fingerprint(self.scopes)
+
+        self.role_names: Tuple[str, ...] = tuple(roles)
+        self.role_bits: Dict[str, int] = {name: 1 << i for i, name in enumerate(self.role_names)}
+        # role -> bits of the role and of every role it inherits
+        self.role_closure: Dict[str, int] = {}
+        # role -> scopes granted by the role and the roles it inherits
+        self.role_scopes: Dict[str, int] = {}
+        for name in self.role_names:
+            self._compile_role(name, roles, ())
+
+        self.scope_mask = lru_cache(maxsize=4096)(self._scope_mask)
+        self.role_mask = lru_cache(maxsize=1024)(self._role_mask)
+        self.scope_names = lru_cache(maxsize=1024)(self._scope_names)
+        self.required_mask = lru_cache(maxsize=1024)(self.compile)
+
+    def _compile_role(self, name: str, roles: Mapping[str, dict], path: Tuple[str, ...]):
+        if name in self.role_closure:
+            return
+        if name in path:
+            raise ValueError(f"Role inheritance cycle: {' -> '.join(path + (name,))}")
+        if name not in roles:
+            raise ValueError(f"Role {path[-1]} inherits the undefined role {name}")
+        definition = roles[name]
+        closure, granted = self.role_bits[name], self.compile(definition.get("scopes", ()))
+        for parent in definition.get("inherits", ()):
+            self._compile_role(parent, roles, path + (name,))
+            closure |= self.role_closure[parent]
+            granted |= self.role_scopes[parent]
+        self.role_closure[name] = closure
+        self.role_scopes[name] = granted
+
+    def compile(self, names: Iterable[str], strict: bool = True) -> int:
+        """
+        Mask of a list of scopes, wildcards included. Unknown scopes are an
+        error when strict, and are ignored otherwise (e.g. stored grants of
+        a scope that no longer exists).
+        """
+        mask = 0
+        for name in names:
+            if name == WILDCARD:
+                mask |= self.all_scopes
+            elif name.endswith(WILDCARD):
+                prefix = name[:-1]
+                matched = 0
+                for scope, bit in self.scope_bits.items():
+                    if scope.startswith(prefix):
+                        matched |= bit
+                if not matched and strict:
+                    raise ValueError(f"No scope matches {name}")
+                mask |= matched
+            elif name in self.scope_bits:
+                mask |= self.scope_bits[name]
+            elif strict:
+                raise ValueError(f"Unknown scope {name}")
+        return mask
+
+    def compile_routes(self, routes: Iterable):
+        """
+        Compiles the scopes every route requires, so a route that requires
+        an unknown scope fails on startup instead of on its first request.
+        """
+        for route in routes:
+            pending = [route.dependant] if hasattr(route, "dependant") else []
+            while pending:
+                dependant = pending.pop()
+                if dependant.security_scopes:
+                    try:
+                        self.required_mask(tuple(dependant.security_scopes))
+                    except ValueError as e:
+                        raise ValueError(f"{route.path}: {e}") from e
+                pending.extend(dependant.dependencies)
+
+    def _scope_mask(self, names: Tuple[str, ...]) -> int:
+        return self.compile(names, strict=False)
+
+    def _role_mask(self, names: Tuple[str, ...]) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.role_closure.get(name, 0)
+        return mask
+
+    def _scope_names(self, mask: int) -> Tuple[str, ...]:
+        return tuple(name for name, bit in self.scope_bits.items() if mask & bit)
+
+    def allowed_roles_mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            if name not in self.role_bits:
+                raise ValueError(f"Unknown role {name}")
+            mask |= self.role_bits[name]
+        return mask
+
+    def grants(self, scopes: Sequence[str], roles: Sequence[str]) -> int:
+        """
+        Scopes a user holds: its own plus those granted by its roles
+        """
+        mask = self.scope_mask(tuple(scopes))
+        for role in roles:
+            mask |= self.role_scopes.get(role, 0)
+        return mask
+
+    @staticmethod
+    def satisfies(granted: int, required: int) -> bool:
+        return not required & ~granted
+
+    def claims(self, mask: int) -> dict:
+        return {"scm": format(mask, "x"), "spv": self.version}
+
+    def token_mask(self, payload: dict) -> Optional[int]:
+        """
+        Scope mask of a decoded token, None if the token can not be trusted
+        to mean what this policy means. Tokens with a 'scopes' list (issued
+        before scope masks) are compiled from the list.
+        """
+        if "scm" not in payload:
+            return self.scope_mask(tuple(payload.get("scopes", [])))
+        covered = self.versions.get(payload.get("spv"))
+        if covered is None:
+            return None
+        try:
+            mask = int(payload["scm"], 16)
+        except (TypeError, ValueError):
+            return None
+        if mask < 0:
+            return None
+        return mask & covered
+
+
+policy = Policy(SCOPES, ROLES)
@@ -0,0 +1,211 @@
+"""
+In-memory typeahead index over the nomenclature catalog. Names and
+descriptions are normalized (case and accent insensitive) and split
+into tokens kept in a sorted array per NomenclatureType, so a prefix
+lookup is a binary search instead of a collection scan.
+The index is loaded on startup and kept current by the nomenclature
+write endpoints of this worker and, with NOMENCLATURE_EVENTS_SOURCE set
+to change_stream, by the writes of every other worker too. Otherwise it
+is per worker and can be reloaded periodically.
+"""
+import asyncio
+import heapq
+import logging
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from decouple import config
+
+from src.dtos.models import Nomenclature, PyObjectId
+from src.dtos.viewmodels import nomenclature_row, NOMENCLATURE_PROJECTION
+from src.services.events import DELETED
+from src.inmutables import NomenclatureType
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_SPLIT = re.compile(r"[^\w]+")
+
+# Rank of a match, lower is better
+NAME_PREFIX, NAME_TOKEN, DESCRIPTION_TOKEN = 0, 1, 2
+# Candidates ranked per result asked for. A short prefix matches a good
+# part of the catalog, so the lookup stops after this many instead of
+# ranking every match on each keystroke
+CANDIDATES_PER_RESULT = 50
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Lower cases the text and strips the accents, so 'Categoría' and
+    'categoria' are the same thing for the index.
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [t for t in _TOKEN_SPLIT.split(normalize(text)) if t]
+
+
+class _Entry:
+    __slots__ = ("row", "type", "name", "name_tokens", "description_tokens")
+
+    def __init__(self, row: dict):
+        # Only the fields of the search response are kept, as a plain dict
+        self.row = row
+        self.type = NomenclatureType(row["type"])
+        self.name = normalize(row["Name"])
+        self.name_tokens = set(tokenize(row["Name"]))
+        self.description_tokens = set(tokenize(row.get("description"))) - self.name_tokens
+
+    @property
+    def tokens(self) -> Set[str]:
+        return self.name_tokens | self.description_tokens
+
+
+class NomenclatureSearchIndex:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        # (token, id) pairs sorted by token, one array per type
+        self._tokens: Dict[NomenclatureType, List[Tuple[str, str]]] = {t: [] for t in NomenclatureType}
+        self.loaded = False
+        # Changes seen while loading, replayed over the new snapshot
+        self._changes_while_loading: Optional[List[Tuple[str, dict]]] = None
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def load(self):
+        """
+        (Re)builds the whole index from the database, reading only the
+        projected fields of each nomenclature. The current index keeps
+        serving searches until the new one is complete.
+        """
+        entries: Dict[str, _Entry] = {}
+        index: Dict[NomenclatureType, List[Tuple[str, str]]] = {t: [] for t in NomenclatureType}
+        self._changes_while_loading = []
+        try:
+            async for raw in Nomenclature.get_motor_collection().find({}, NOMENCLATURE_PROJECTION):
+                entry = _Entry(nomenclature_row(raw))
+                entries[str(raw["_id"])] = entry
+                index[entry.type].extend((token, str(raw["_id"])) for token in entry.tokens)
+            for tokens in index.values():
+                tokens.sort()
+        finally:
+            changes, self._changes_while_loading = self._changes_while_loading, None
+        self._entries, self._tokens = entries, index
+        for event, data in changes:
+            self.apply(event, data)
+        self.loaded = True
+
+    def add(self, row: dict):
+        """
+        Adds a nomenclature row (see nomenclature_row) to the index,
+        replacing its previous version if it was already indexed.
+        """
+        id = str(row["_id"])
+        self.remove(id)
+        entry = _Entry(row)
+        self._entries[id] = entry
+        for token in entry.tokens:
+            insort(self._tokens[entry.type], (token, id))
+
+    def remove(self, id: PyObjectId):
+        entry = self._entries.pop(str(id), None)
+        if entry is None:
+            return
+        tokens = self._tokens[entry.type]
+        for token in entry.tokens:
+            i = bisect_left(tokens, (token, str(id)))
+            if i < len(tokens) and tokens[i] == (token, str(id)):
+                del tokens[i]
+
+    def apply(self, event: str, data: dict):
+        """
+        Applies a nomenclature event, as published by the change stream
+        source (see events.py)
+        """
+        if self._changes_while_loading is not None:
+            self._changes_while_loading.append((event, data))
+        if event == DELETED:
+            self.remove(data["_id"])
+        else:
+            self.add(data)
+
+    def start_reloading(self, interval_seconds: float):
+        async def reload():
+            while True:
+                await asyncio.sleep(interval_seconds)
+                try:
+                    await self.load()
+                except Exception:
+                    logger.exception("Reloading the nomenclature search index failed")
+
+        self._reload_task = asyncio.get_running_loop().create_task(reload())
+
+    async def stop_reloading(self):
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+            try:
+                await self._reload_task
+            except asyncio.CancelledError:
+                pass
+
+    def _ids_with_prefix(
+            self, prefix: str, nomenclature_type: Optional[NomenclatureType], max_ids: int
+    ) -> Set[str]:
+        types = [nomenclature_type] if nomenclature_type is not None else list(NomenclatureType)
+        ids = set()
+        for t in types:
+            tokens = self._tokens[t]
+            i = bisect_left(tokens, (prefix,))
+            while i < len(tokens) and tokens[i][0].startswith(prefix):
+                ids.add(tokens[i][1])
+                if len(ids) >= max_ids:
+                    return ids
+                i += 1
+        return ids
+
+    def search(self, query: str, nomenclature_type: Optional[NomenclatureType] = None, limit: int = 10):
+        """
+        Returns up to `limit` nomenclatures where every token of the query
+        is a prefix of some token of the name or description. Matches on
+        the start of the name come first, then matches on any name token,
+        then matches on the description only; shorter names first. Only the
+        first `limit * CANDIDATES_PER_RESULT` matches of the longest token
+        (in token order) are ranked, so a very short query may miss better
+        ranked matches further on.
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        # Longest token is the most selective one, use it to pick candidates
+        pivot = max(query_tokens, key=len)
+        rest = [t for t in query_tokens if t is not pivot]
+        full_query = normalize(query).strip()
+
+        ranked = []
+        for id in self._ids_with_prefix(pivot, nomenclature_type, limit * CANDIDATES_PER_RESULT):
+            entry = self._entries[id]
+            tokens = entry.tokens
+            if not all(any(token.startswith(q) for token in tokens) for q in rest):
+                continue
+            if entry.name.startswith(full_query):
+                rank = NAME_PREFIX
+            elif all(any(token.startswith(q) for token in entry.name_tokens) for q in query_tokens):
+                rank = NAME_TOKEN
+            else:
+                rank = DESCRIPTION_TOKEN
+            ranked.append((rank, len(entry.name), entry.name, id))
+
+        return [self._entries[id].row for *_, id in heapq.nsmallest(limit, ranked)]
+
+
+# Seconds between reloads of the index, 0 to never reload. Only needed
+# when other workers or the console write without a change stream
+index_reload_seconds = config("NOMENCLATURE_INDEX_RELOAD_SECONDS", default=0, cast=float)
+nomenclature_index = NomenclatureSearchIndex()
@@ -0,0 +1,158 @@
+"""
+Deterministic synthetic datasets for scale testing. The same seed always
+generates the same documents (ids included), so profiles and benchmarks
+taken on different machines run against the same data.
+"""
+import asyncio
+import hashlib
+import random
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+
+from src.dtos.models import SCOPES
+from src.inmutables import NomenclatureType
+
+# Share of the catalog per type, most of it are check list concepts
+NOMENCLATURE_TYPE_WEIGHTS = {
+    NomenclatureType.concept_check_item: 40,
+    NomenclatureType.category_check_item: 20,
+    NomenclatureType.group_check_item: 15,
+    NomenclatureType.type_check_item: 15,
+    NomenclatureType.data_type: 8,
+    NomenclatureType.temperature_unit: 2,
+}
+PATTERNS = (r"^\d+$", r"^\d+(\.\d+)?$", r"^[A-Z]{2,4}-\d{3,6}$", r"^.{1,255}$", r"^\d{4}-\d{2}-\d{2}$")
+MAX_LEVEL = 5
+
+# (role, scopes, weight) of the user profiles
+USER_PROFILES = (
+    ("Admin", tuple(SCOPES), 2),
+    ("Admin", ("nomenclature:read", "nomenclature:write", "nomenclature:delete", "users:read"), 8),
+    ("User", ("nomenclature:read", "publication-project:read", "publication-project:write"), 60),
+    ("User", ("nomenclature:read", "publication-project:read", "publication-project:write",
+              "publication-project:commit"), 25),
+    (None, ("nomenclature:read",), 5),
+)
+
+_SYLLABLES = (
+    "ra", "to", "me", "li", "sa", "con", "ter", "mi", "no", "ca", "de", "pro", "ve", "tu", "la",
+    "gra", "ni", "cio", "ma", "re", "ba", "sen", "cu", "lo", "tra", "men", "di", "po", "ze", "ria"
+)
+_FIRST_NAMES = ("Ana", "Luis", "Maria", "Jose", "Carmen", "Pedro", "Lucia", "Jorge", "Elena", "Raul",
+                "Sofia", "Diego", "Laura", "Pablo", "Marta", "Ivan", "Clara", "Hugo", "Rosa", "Tomas")
+_LAST_NAMES = ("Garcia", "Perez", "Rodriguez", "Gonzalez", "Fernandez", "Lopez", "Martinez", "Sanchez",
+               "Diaz", "Hernandez", "Alvarez", "Romero", "Navarro", "Torres", "Ramos", "Castro")
+# Fixed creation time for the generated ids, 2020-01-01
+_ID_EPOCH = 1577836800
+
+
+def seeded_object_id(seed: int, kind: str, index: int) -> ObjectId:
+    """
+    Unique, reproducible id of the index-th generated document of a kind
+    """
+    prefix = hashlib.sha1(f"{seed}:{kind}".encode()).hexdigest()[:8]
+    return ObjectId(f"{_ID_EPOCH:08x}{prefix}{index:08x}")
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4)))
+
+
+def _text(rng: random.Random, mean_length: float, max_length: int) -> str:
+    # Name lengths are skewed: most are short, a few are long
+    target = min(max_length, max(3, int(rng.lognormvariate(0, 0.5) * mean_length)))
+    words = []
+    while sum(len(w) + 1 for w in words) < target:
+        words.append(_word(rng))
+    return " ".join(words)[:max_length].strip().capitalize()
+
+
+def nomenclature_documents(count: int, seed: int = 0, version: int = 0) -> Iterator[dict]:
+    rng = random.Random(f"nomenclature:{seed}")
+    types = list(NOMENCLATURE_TYPE_WEIGHTS)
+    weights = list(NOMENCLATURE_TYPE_WEIGHTS.values())
+    for i in range(count):
+        nomenclature_type = rng.choices(types, weights)[0]
+        yield {
+            "_id": seeded_object_id(seed, "nomenclature", i),
+            "Name": _text(rng, 18, 120),
+            "type": nomenclature_type.value,
+            "pattern": rng.choice(PATTERNS) if nomenclature_type == NomenclatureType.data_type else None,
+            "description": _text(rng, 60, 500) if rng.random() < 0.6 else None,
+            "level": rng.randint(1, MAX_LEVEL) if nomenclature_type == NomenclatureType.type_check_item else None,
+            "revision": 0,
+            "version": version,
+        }
+
+
+def user_documents(count: int, hashed_password: str, seed: int = 0) -> Iterator[dict]:
+    rng = random.Random(f"users:{seed}")
+    weights = [weight for *_, weight in USER_PROFILES]
+    for i in range(count):
+        role, scopes, _ = rng.choices(USER_PROFILES, weights)[0]
+        first, last = rng.choice(_FIRST_NAMES), rng.choice(_LAST_NAMES)
+        username = f"{first.lower()}.{last.lower()}{i}"
+        yield {
+            "_id": seeded_object_id(seed, "users", i),
+            "username": username,
+            # every seeded user shares the hash, hashing 100k passwords takes hours
+            "hashed_password": hashed_password,
+            "email": f"{username}@example.com",
+            "full_name": f"{first} {last}",
+            "disabled": rng.random() < 0.03,
+            "scopes": list(scopes),
+            "roles": [{"name": role}] if role else [],
+            "revision": 0,
+        }
+
+
+def batches(documents: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def insert_batches(
+        collection,
+        documents: Iterable[dict],
+        batch_size: int = 5000,
+        concurrency: int = 8,
+        progress: Optional[Callable[[int], None]] = None
+) -> int:
+    """
+    Inserts the documents with up to `concurrency` unordered insert_many
+    in flight. Batches are generated as slots free up, so memory stays
+    bounded whatever the size of the dataset.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    inserted = 0
+    tasks = []
+    failed = False
+
+    async def insert(batch):
+        nonlocal inserted, failed
+        try:
+            await collection.insert_many(batch, ordered=False)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            slots.release()
+        inserted += len(batch)
+        if progress is not None:
+            progress(inserted)
+
+    for batch in batches(documents, batch_size):
+        await slots.acquire()
+        if failed:
+            # stop generating, gather below raises the error
+            break
+        tasks.append(asyncio.ensure_future(insert(batch)))
+    await asyncio.gather(*tasks)
+    return inserted
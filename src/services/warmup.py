@@ -0,0 +1,123 @@
+"""
+Startup warm-up pipeline. Everything a cold worker would otherwise pay
+for on its first real requests (pool connections, OpenAPI generation,
+hashing and JWT backends, response serialization) is done here once,
+before the readiness probe reports the instance as ready. It runs in the
+background, so the probes are served (and report the warm-up) meanwhile.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from decouple import config
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+
+
+class WarmupState:
+    """
+    Keeps track of the warm-up steps of this worker and their outcome
+    """
+
+    def __init__(self, step_timeout: float = 10):
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.steps: Dict[str, dict] = {}
+        # Steps whose failure means the worker must not receive traffic
+        self.required = {"mongo_pool", "mongo_ping"}
+        # Seconds a step can take, e.g. with an unreachable database
+        self.step_timeout = step_timeout
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def warming(self):
+        return self.started_at is not None and not self.finished
+
+    @property
+    def ready(self):
+        return self.finished and all(self.steps.get(step, {}).get("ok") for step in self.required)
+
+    async def run_step(self, name: str, step: Callable[[], Awaitable[None]]):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), timeout=self.step_timeout)
+            self.steps[name] = {"ok": True, "ms": (time.perf_counter() - start) * 1000}
+        except asyncio.TimeoutError:
+            self.steps[name] = {"ok": False, "ms": (time.perf_counter() - start) * 1000,
+                                "error": f"Timed out after {self.step_timeout:g}s"}
+        except Exception as e:
+            self.steps[name] = {"ok": False, "ms": (time.perf_counter() - start) * 1000, "error": str(e)}
+
+    def start(self, app: FastAPI):
+        """
+        Runs the warm-up in the background. Must be called from a coroutine.
+        """
+        self._task = asyncio.get_running_loop().create_task(warm_up(app, self))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+warmup_state = WarmupState(step_timeout=config("WARMUP_STEP_TIMEOUT_SECONDS", default=10, cast=float))
+
+
+async def ping_database(timeout: float = 2.0) -> float:
+    """
+    Pings the database and returns the round trip in milliseconds
+    """
+    from src.dataaccess.database import db
+    start = time.perf_counter()
+    await asyncio.wait_for(db.command("ping"), timeout=timeout)
+    return (time.perf_counter() - start) * 1000
+
+
+async def _open_pool():
+    # Concurrent commands force the driver to open one connection each
+    from src.dataaccess.database import db, min_pool_size
+    await asyncio.gather(*(db.command("ping") for _ in range(max(min_pool_size, 1))))
+
+
+async def _ping():
+    await ping_database()
+
+
+def _warm_crypto():
+    from src.services.crypto import CryptoService
+    from src.services.policy import policy
+    hashed = CryptoService.get_password_hash("warm-up")
+    CryptoService.verify_password("warm-up", hashed)
+    token = CryptoService.create_access_token({"sub": "warm-up", **policy.claims(0)}, timedelta(minutes=1))
+    policy.token_mask(CryptoService.decode_token(token))
+
+
+def _warm_serialization():
+    from bson import ObjectId
+    from src.dtos.viewmodels import Response, Page, NomenclatureViewModel
+    from src.inmutables import NomenclatureType
+    item = NomenclatureViewModel(_id=ObjectId(), Name="warm-up", type=NomenclatureType.data_type)
+    jsonable_encoder(Response(data=Page(items=[item], records=1, total=1)))
+
+
+async def warm_up(app: FastAPI, state: WarmupState = warmup_state):
+    """
+    Runs the whole warm-up pipeline. Synchronous CPU bound steps run in
+    a thread so a slow hash does not hold the event loop while the pool
+    connections are being opened.
+    """
+    state.started_at = datetime.utcnow()
+    await state.run_step("mongo_pool", _open_pool)
+    await state.run_step("mongo_ping", _ping)
+    await state.run_step("openapi", lambda: asyncio.to_thread(app.openapi))
+    await state.run_step("crypto", lambda: asyncio.to_thread(_warm_crypto))
+    await state.run_step("serialization", lambda: asyncio.to_thread(_warm_serialization))
+    state.finished_at = datetime.utcnow()
@@ -0,0 +1,199 @@
+"""
+Event loop lag watchdog. A heartbeat coroutine measures how late the
+loop wakes it up, while a monitor thread notices when the heartbeat
+stalls and captures the stack of whatever is blocking the loop thread,
+tagged with the route of the request being served at that moment.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Dict, Optional, Tuple
+
+from decouple import config
+
+# Upper bounds (in ms) of the lag histogram buckets
+LAG_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+MAX_STACK_DEPTH = 30
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoopWatchdog:
+    def __init__(self, threshold_ms: float = 100, interval_ms: float = 50, max_sites: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.max_sites = max_sites
+        self.histogram: Dict[str, int] = {self._bucket_label(b): 0 for b in LAG_BUCKETS + (None,)}
+        self.samples = 0
+        self.max_lag_ms = 0.0
+        self.sites: Dict[Tuple[str, str], dict] = {}
+        # Request scope of every in-flight task, so a blocking stack
+        # can be attributed to a route. Tasks spawned while serving a
+        # request (e.g. a coalesced handler) inherit the scope
+        self.requests: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+        self._previous_task_factory = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.perf_counter()
+        self._captured_beat: Optional[float] = None
+        self._pending_site: Optional[Tuple[str, str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @staticmethod
+    def _bucket_label(bound: Optional[int]):
+        return f"<={bound}ms" if bound is not None else f">{LAG_BUCKETS[-1]}ms"
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """
+        Starts monitoring the running loop. Must be called from a coroutine.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._previous_task_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self._loop is not None:
+            self._loop.set_task_factory(self._previous_task_factory)
+
+    def _task_factory(self, loop, coro, **kwargs):
+        # The scope is looked up by task from the monitor thread, which can
+        # not read the context variables of the loop thread
+        if self._previous_task_factory is not None:
+            task = self._previous_task_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        parent = asyncio.current_task(loop)
+        scope = self.requests.get(parent) if parent is not None else None
+        if scope is not None:
+            self.requests[task] = scope
+        return task
+
+    async def _heartbeat(self):
+        while self._running:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._record_lag(max(now - expected, 0) * 1000)
+            self._beat = now
+
+    def _record_lag(self, lag_ms: float):
+        bucket = next((b for b in LAG_BUCKETS if lag_ms <= b), None)
+        with self._lock:
+            self.samples += 1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.histogram[self._bucket_label(bucket)] += 1
+            # The stall captured by the monitor thread just ended, so now
+            # we know how long it really was
+            if self._pending_site is not None and self._pending_site in self.sites:
+                site = self.sites[self._pending_site]
+                site["max_lag_ms"] = max(site["max_lag_ms"], lag_ms)
+            self._pending_site = None
+
+    def _monitor(self):
+        while self._running:
+            time.sleep(self.interval)
+            beat = self._beat
+            stalled = time.perf_counter() - beat
+            if stalled > self.threshold + self.interval and self._captured_beat != beat:
+                self._captured_beat = beat
+                self._capture(stalled * 1000)
+
+    def _current_route(self) -> str:
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        scope = self.requests.get(task) if task is not None else None
+        if scope is None:
+            return "<no request>"
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            return getattr(endpoint, "__name__", str(endpoint))
+        return f"{scope.get('method', '')} {scope.get('path', '')}".strip()
+
+    def _capture(self, stalled_ms: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=MAX_STACK_DEPTH)
+        # Blame the innermost frame of our own code if there is one, the
+        # innermost frame overall otherwise (e.g. inside bcrypt or jose)
+        own = [f for f in stack if f.filename.startswith(SOURCE_DIR) and f.filename != __file__]
+        blamed = (own or list(stack))[-1]
+        key = (self._current_route(), f"{blamed.filename}:{blamed.lineno} in {blamed.name}")
+        with self._lock:
+            if key not in self.sites and len(self.sites) >= self.max_sites:
+                return
+            site = self.sites.setdefault(key, {"count": 0, "max_lag_ms": 0.0})
+            site["count"] += 1
+            site["max_lag_ms"] = max(site["max_lag_ms"], stalled_ms)
+            site["stack"] = traceback.format_list(stack)
+            self._pending_site = key
+
+    def report(self, top: int = 10) -> dict:
+        with self._lock:
+            sites = sorted(self.sites.items(), key=lambda kv: (kv[1]["count"], kv[1]["max_lag_ms"]), reverse=True)
+            return {
+                "enabled": self._running,
+                "threshold_ms": self.threshold * 1000,
+                "samples": self.samples,
+                "max_lag_ms": self.max_lag_ms,
+                "histogram": dict(self.histogram),
+                "blocking_sites": [
+                    {"route": route, "site": site, "count": data["count"],
+                     "max_lag_ms": data["max_lag_ms"], "stack": data.get("stack", [])}
+                    for (route, site), data in sites[:top]
+                ],
+            }
+
+
+class LoopWatchdogMiddleware:
+    """
+    ASGI middleware that tags each request task with its scope, so the
+    watchdog knows which route was running when the loop got blocked.
+    """
+
+    def __init__(self, app, watchdog: LoopWatchdog):
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        task = asyncio.current_task()
+        self.watchdog.requests[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.watchdog.requests.pop(task, None)
+
+
+watchdog_enabled = config("LOOP_WATCHDOG_ENABLED", default=False, cast=bool)
+loop_watchdog = LoopWatchdog(
+    threshold_ms=config("LOOP_WATCHDOG_THRESHOLD_MS", default=100, cast=float),
+    interval_ms=config("LOOP_WATCHDOG_INTERVAL_MS", default=50, cast=float),
+)
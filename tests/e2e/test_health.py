@@ -6,5 +6,16 @@ client = TestClient(api)
 
 
 def test_api_is_live():
-    response = client.get("/health")
+    response = client.get("/api/v1/admin/health")
     assert response.status_code == status.HTTP_200_OK
+
+
+def test_liveness_probe():
+    response = client.get("/api/v1/admin/health/live")
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_not_ready_before_warm_up():
+    response = client.get("/api/v1/admin/health/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["data"]["ready"] is False
@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+from fastapi import status
+from src.dtos.encoding import unpackb, MSGPACK_MEDIA_TYPE
+from src.main import api
+
+client = TestClient(api)
+
+
+def test_json_stays_the_default():
+    response = client.get("/api/v1/admin/nomenclature/types", headers={"Accept": "*/*"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.headers["vary"] == "Accept"
+
+
+def test_msgpack_is_served_when_asked_for():
+    json_response = client.get("/api/v1/admin/nomenclature/types")
+    response = client.get("/api/v1/admin/nomenclature/types", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert unpackb(response.content) == json_response.json()
+    assert len(response.content) < len(json_response.content)
+
+
+def test_authorization_errors_are_served_as_msgpack():
+    response = client.get("/api/v1/admin/nomenclature/search?q=a", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert unpackb(response.content) == {"detail": "Not authenticated"}
@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+from fastapi import status
+from src.main import api
+
+client = TestClient(api)
+
+
+def test_jwks_is_served_with_cache_headers():
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == status.HTTP_200_OK
+    assert "keys" in response.json()
+    assert "max-age" in response.headers["cache-control"]
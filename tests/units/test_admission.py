@@ -0,0 +1,71 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from src.services.admission import (
+    AdmissionClass, AdmissionController, PRIORITY_AUTHENTICATED_READ, PRIORITY_DEFAULT
+)
+from src.services.crypto import CryptoService
+
+
+@pytest.mark.asyncio
+async def test_sheds_when_queue_is_full_or_deadline_passes():
+    admission = AdmissionClass("test", limit=1, queue_size=1, deadline_ms=50)
+    assert await admission.acquire()
+
+    waiting = asyncio.ensure_future(admission.acquire())
+    await asyncio.sleep(0)
+    # queue is full
+    assert not await admission.acquire()
+    # the one waiting gives up after the deadline
+    assert not await waiting
+
+    admission.release()
+    assert admission.report()["active"] == 0
+    assert (admission.admitted, admission.queued, admission.shed) == (1, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_authenticated_reads_are_admitted_first():
+    admission = AdmissionClass("test", limit=1, queue_size=10, deadline_ms=1000)
+    await admission.acquire()
+    order = []
+
+    async def request(name, priority):
+        await admission.acquire(priority)
+        order.append(name)
+        admission.release()
+
+    tasks = [asyncio.ensure_future(request("anonymous", PRIORITY_DEFAULT)),
+             asyncio.ensure_future(request("authenticated", PRIORITY_AUTHENTICATED_READ))]
+    await asyncio.sleep(0)
+    admission.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["authenticated", "anonymous"]
+    assert admission.active == 0
+
+
+def test_classification():
+    def scope(method, path):
+        return {"type": "http", "method": method, "path": path}
+
+    assert AdmissionController.classify(scope("GET", "/api/v1/admin/health/ready")) is None
+    assert AdmissionController.classify(scope("POST", "/api/v1/admin/account/token")) == "auth"
+    assert AdmissionController.classify(scope("GET", "/api/v1/admin/nomenclature/type/Type")) == "catalog"
+    assert AdmissionController.classify(scope("PATCH", "/api/v1/admin/nomenclature/1")) == "writes"
+    assert AdmissionController.classify(scope("GET", "/api/v1/admin/user/admin")) == "default"
+
+
+def test_only_valid_tokens_get_priority():
+    def scope(token):
+        return {"type": "http", "method": "GET", "path": "/api/v1/admin/nomenclature",
+                "headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+    valid = CryptoService.create_access_token({"sub": "alice"}, timedelta(minutes=1))
+    expired = CryptoService.create_access_token({"sub": "alice"}, timedelta(minutes=-1))
+    assert AdmissionController.priority(scope(valid)) == PRIORITY_AUTHENTICATED_READ
+    assert AdmissionController.priority(scope("x")) == PRIORITY_DEFAULT
+    assert AdmissionController.priority(scope(valid[:-2] + "xx")) == PRIORITY_DEFAULT
+    assert AdmissionController.priority(scope(expired)) == PRIORITY_DEFAULT
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.services.coalescing import SingleFlight
+from src.services.crypto import CryptoService
+
+
+def make_request(query=b"", token=None):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "method": "GET", "path": "/nomenclature", "query_string": query,
+                    "headers": headers})
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_execution():
+    group = SingleFlight()
+    calls = 0
+
+    async def handler():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return Response(content=b'{"data": []}', media_type="application/json")
+
+    responses = await asyncio.gather(*(group.run("key", "/nomenclature", handler) for _ in range(10)))
+
+    assert calls == 1
+    assert all(r.body == b'{"data": []}' for r in responses)
+    assert len({id(r) for r in responses}) == 10
+    assert group.report()["routes"] == [{"route": "/nomenclature", "executed": 1, "collapsed": 9}]
+    assert group.report()["in_flight"] == 0
+
+
+def test_key_depends_on_query_and_scopes_but_not_on_user():
+    def token(sub, scopes):
+        return CryptoService.create_access_token(
+            {"sub": sub, "scopes": scopes, "roles": ["Admin"]}, timedelta(minutes=1)
+        )
+
+    alice = SingleFlight.key_for(make_request(b"skip=0&limit=10", token("alice", ["nomenclature:read"])), "/n")
+    bob = SingleFlight.key_for(make_request(b"limit=10&skip=0", token("bob", ["nomenclature:read"])), "/n")
+    writer = SingleFlight.key_for(make_request(b"limit=10&skip=0", token("bob", ["nomenclature:write"])), "/n")
+
+    assert alice == bob
+    assert alice != writer
+    assert SingleFlight.key_for(make_request(b"limit=10"), "/n") is None
+    assert SingleFlight.key_for(make_request(b"limit=10", "not-a-token"), "/n") is None
+
+
+def test_the_token_is_decoded_once_per_request(monkeypatch):
+    token = CryptoService.create_access_token(
+        {"sub": "alice", "scopes": ["nomenclature:read"], "roles": ["Admin"]}, timedelta(minutes=1)
+    )
+    request = make_request(b"", token)
+    decode = CryptoService.decode_token
+    calls = []
+    monkeypatch.setattr(CryptoService, "decode_token", staticmethod(lambda t: calls.append(t) or decode(t)))
+
+    SingleFlight.key_for(request, "/n")
+    assert CryptoService.decode_request_token(request, token)["sub"] == "alice"
+    assert calls == [token]
+
+
+@pytest.mark.asyncio
+async def test_shared_call_keeps_its_dependencies_when_the_leader_goes_away():
+    from contextlib import AsyncExitStack
+    from fastapi import Depends, FastAPI
+    from src.controllers.routers import ApiController
+    from src.services.coalescing import single_flight
+
+    events = []
+
+    async def session():
+        try:
+            yield "session"
+        finally:
+            events.append("closed")
+
+    router = ApiController()
+
+    @router.get("/shared")
+    @single_flight
+    async def shared(s=Depends(session)):
+        await asyncio.sleep(0.05)
+        events.append("used")
+        return {"data": s}
+
+    app = FastAPI()
+    app.include_router(router)
+    handler = next(r for r in app.routes if r.path == "/shared").get_route_handler()
+    token = CryptoService.create_access_token(
+        {"sub": "alice", "scopes": ["nomenclature:read"], "roles": ["Admin"]}, timedelta(minutes=1)
+    )
+
+    def request(stack):
+        scope = make_request(b"", token).scope
+        scope.update(app=app, path="/shared", fastapi_astack=stack)
+        return Request(scope)
+
+    async with AsyncExitStack() as leader_stack, AsyncExitStack() as follower_stack:
+        leader = asyncio.ensure_future(handler(request(leader_stack)))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(handler(request(follower_stack)))
+        await asyncio.sleep(0.01)
+        # the leader's client disconnects: its request is cancelled and
+        # its dependencies closed
+        leader.cancel()
+        await leader_stack.aclose()
+        response = await follower
+
+    assert response.status_code == 200
+    assert events == ["used", "closed"]
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi import FastAPI, Body
+from fastapi.testclient import TestClient
+
+from src.controllers.routers import ApiController
+from src.dtos.encoding import negotiate, packb, unpackb, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE
+from src.dtos.viewmodels import NomenclatureForm, nomenclature_row, page_response
+
+
+def test_object_ids_and_datetimes_round_trip_as_extension_types():
+    value = {"_id": ObjectId(), "at": datetime(2022, 3, 1, 12, 30, tzinfo=timezone.utc), "n": [1, "a", None]}
+    assert unpackb(packb(value)) == value
+    # a naive datetime is taken as UTC
+    assert unpackb(packb(datetime(2022, 3, 1))) == datetime(2022, 3, 1, tzinfo=timezone.utc)
+
+
+def test_negotiation_prefers_json_unless_msgpack_ranks_higher():
+    assert negotiate("") == JSON_MEDIA_TYPE
+    assert negotiate("*/*") == JSON_MEDIA_TYPE
+    assert negotiate("application/msgpack") == MSGPACK_MEDIA_TYPE
+    assert negotiate("application/json;q=0.5, application/msgpack") == MSGPACK_MEDIA_TYPE
+    assert negotiate("application/json, application/x-msgpack;q=0.9") == JSON_MEDIA_TYPE
+
+
+def make_client():
+    router = ApiController(prefix="/echo")
+
+    @router.post("")
+    async def echo(model: NomenclatureForm = Body(...)):
+        return page_response([nomenclature_row({"_id": ObjectId(b"a" * 12), **model.dict()})], 1)
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_msgpack_bodies_are_read_and_lean_pages_keep_object_ids():
+    client = make_client()
+    body = packb({"Name": "Integer", "type": "DataType", "pattern": r"\d+"})
+    response = client.post("/echo", data=body, headers={
+        "Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE
+    })
+    assert response.status_code == 200
+    item = unpackb(response.content)["data"]["items"][0]
+    assert item["_id"] == ObjectId(b"a" * 12)
+    assert item["Name"] == "Integer" and item["has_pattern"]
+
+    response = client.post("/echo", data=b"\xc1", headers={"Content-Type": MSGPACK_MEDIA_TYPE})
+    assert response.status_code == 400
+
+
+def test_errors_are_negotiated_too():
+    client = make_client()
+    response = client.post("/echo", data=packb({"Name": "No type"}), headers={
+        "Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE
+    })
+    assert response.status_code == 422
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert unpackb(response.content)["detail"][0]["loc"] == ["body", "type"]
+
+    response = client.post("/echo", data=b"\xc1", headers={
+        "Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE
+    })
+    assert response.status_code == 400
+    assert unpackb(response.content) == {"detail": "The msgpack body could not be decoded"}
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from src.services.events import EventHub, CREATED, DELETED
+
+
+async def take(stream, count):
+    return [await stream.__anext__() for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_subscribers_get_published_events():
+    hub = EventHub()
+    first, second = hub.stream(), hub.stream()
+    assert await take(first, 1) == ["retry: 3000\n\n"]
+    assert await take(second, 1) == ["retry: 3000\n\n"]
+
+    hub.publish(CREATED, 7, {"_id": "a", "Name": "Celsius"})
+    expected = 'id: 7\nevent: created\ndata: {"_id": "a", "Name": "Celsius"}\n\n'
+    assert await take(first, 1) == [expected]
+    assert await take(second, 1) == [expected]
+    await first.aclose()
+    await second.aclose()
+    assert not hub.subscribers
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_events_or_resets():
+    hub = EventHub(buffer_size=2)
+    for version in (1, 2, 3):
+        hub.publish(CREATED, version, {"_id": str(version)})
+
+    resumed = hub.stream(last_event_id=2)
+    _, replayed = await take(resumed, 2)
+    assert replayed.startswith("id: 3\n")
+    await resumed.aclose()
+
+    # event 1 fell out of the buffer
+    stale = hub.stream(last_event_id=0)
+    _, reset = await take(stale, 2)
+    assert reset == 'id: 0\nevent: reset\ndata: {"since": 0}\n\n'
+    await stale.aclose()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_and_idle_stream_gets_heartbeats():
+    hub = EventHub(queue_size=2, heartbeat_seconds=0.01)
+    slow = hub.stream()
+    await take(slow, 1)
+    assert await take(slow, 1) == [": keep-alive\n\n"]
+
+    for version in (1, 2, 3):
+        hub.publish(DELETED, version, {"_id": str(version)})
+    assert hub.dropped == 1 and not hub.subscribers
+    with pytest.raises(StopAsyncIteration):
+        await asyncio.wait_for(slow.__anext__(), 1)
+
+
+@pytest.mark.asyncio
+async def test_events_published_while_resuming_are_sent_once():
+    hub = EventHub(heartbeat_seconds=0.01)
+    for version in (1, 2):
+        hub.publish(CREATED, version, {"_id": str(version)})
+
+    resumed = hub.stream(last_event_id=1)
+    await take(resumed, 1)
+    hub.publish(CREATED, 3, {"_id": "3"})
+    ids = [message.split("\n")[0] for message in await take(resumed, 2)]
+    assert ids == ["id: 2", "id: 3"]
+    assert await take(resumed, 1) == [": keep-alive\n\n"]
+    await resumed.aclose()
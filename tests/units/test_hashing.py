@@ -0,0 +1,29 @@
+import pytest
+from passlib.hash import argon2
+
+from src.services.hashing import build_password_context
+
+
+def test_hash_with_outdated_cost_needs_update():
+    old_context = build_password_context("bcrypt", 4)
+    new_context = build_password_context("bcrypt", 5)
+    hashed = old_context.hash("secret")
+
+    valid, new_hash = new_context.verify_and_update("secret", hashed)
+    assert valid
+    assert new_hash is not None
+    assert not new_context.needs_update(new_hash)
+
+
+def test_hash_with_current_cost_is_kept():
+    context = build_password_context("bcrypt", 4)
+    hashed = context.hash("secret")
+
+    assert context.verify_and_update("secret", hashed) == (True, None)
+    assert context.verify_and_update("wrong", hashed) == (False, None)
+
+
+def test_scheme_without_backend_fails_when_building_the_context(monkeypatch):
+    monkeypatch.setattr(argon2, "has_backend", classmethod(lambda cls, name="any": False))
+    with pytest.raises(RuntimeError, match="install argon2-cffi"):
+        build_password_context("argon2", 1)
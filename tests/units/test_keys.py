@@ -0,0 +1,67 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import JWTError
+
+from src.services.keys import KeySet, load_key_set
+
+
+def ec_pem(curve=ec.SECP256R1()):
+    key = ec.generate_private_key(curve)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def test_es256_tokens_are_verified_with_the_published_key():
+    keys = KeySet("ES256", ec_pem())
+    token = keys.encode({"sub": "admin"})
+
+    assert keys.decode(token) == {"sub": "admin"}
+    jwks = keys.jwks()["keys"]
+    assert [k["kid"] for k in jwks] == [keys.kid]
+    assert jwks[0]["alg"] == "ES256" and "d" not in jwks[0]
+
+
+def test_rotated_keys_still_verify_and_unknown_keys_do_not():
+    old = KeySet("ES256", ec_pem(), kid="old")
+    old_public = old.signing_key.public_key().to_pem().decode()
+    current = KeySet("ES256", ec_pem(), kid="current", verification_keys_pem={"old": old_public})
+
+    assert current.decode(old.encode({"sub": "admin"})) == {"sub": "admin"}
+    with pytest.raises(JWTError):
+        current.decode(KeySet("ES256", ec_pem(), kid="stranger").encode({"sub": "admin"}))
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES265", "hs256"])
+def test_unsupported_algorithms_are_rejected(monkeypatch, algorithm):
+    monkeypatch.setenv("JWT_ALGORITHM", algorithm)
+    with pytest.raises(ValueError, match="Unsupported JWT_ALGORITHM"):
+        load_key_set()
+
+
+def rsa_pem():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def test_keys_rotated_out_keep_their_algorithm():
+    old = KeySet("RS384", rsa_pem(), kid="old")
+    # the algorithm of an EC key is told by its curve
+    older = KeySet("ES384", ec_pem(ec.SECP384R1()), kid="older")
+    current = KeySet("ES256", ec_pem(), kid="current", verification_keys_pem={
+        "old": old.signing_key.public_key().to_pem().decode(),
+        "older": older.signing_key.public_key().to_pem().decode(),
+    }, verification_algorithms={"old": "RS384"})
+
+    assert current.decode(old.encode({"sub": "admin"})) == {"sub": "admin"}
+    assert current.decode(older.encode({"sub": "admin"})) == {"sub": "admin"}
+    assert {key["kid"]: key["alg"] for key in current.jwks()["keys"]} == {
+        "current": "ES256", "old": "RS384", "older": "ES384"
+    }
@@ -0,0 +1,36 @@
+import json
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from src.dtos.models import Nomenclature, User, Role
+from src.dtos.viewmodels import (
+    NomenclatureViewModel, UserAdminViewModel, nomenclature_row, user_admin_row, page_response
+)
+
+
+def rendered(view_model, document):
+    # what FastAPI sends for a document through the response model
+    return jsonable_encoder(view_model.from_orm(document), by_alias=True)
+
+
+def rendered_row(row):
+    return json.loads(page_response([row], 1).body)["data"]["items"][0]
+
+
+def test_nomenclature_row_renders_like_the_view_model():
+    raw = {"_id": ObjectId(), "Name": "Integer", "type": "DataType", "pattern": r"\d+", "revision": 2, "version": 7}
+    document = Nomenclature.construct(id=raw["_id"], **{k: v for k, v in raw.items() if k != "_id"})
+
+    assert rendered_row(nomenclature_row(raw)) == rendered(NomenclatureViewModel, document)
+
+
+def test_user_admin_row_renders_like_the_view_model():
+    raw = {"_id": ObjectId(), "username": "admin", "hashed_password": "x", "scopes": ["users:read"],
+           "roles": [{"name": "Admin"}], "email": "admin@example.com"}
+    document = User.construct(
+        id=raw["_id"], username="admin", hashed_password="x", scopes=["users:read"], roles=[Role(name="Admin")],
+        email="admin@example.com", full_name=None, revision=0
+    )
+
+    assert rendered_row(user_admin_row(raw)) == rendered(UserAdminViewModel, document)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI, HTTPException, Security
+from fastapi.security import SecurityScopes
+
+from src.dtos.models import User, Role
+from src.services.crypto import CryptoService, RoleAuth, adminRole
+from src.services.policy import Policy, policy
+
+SCOPES = ["users:read", "users:write", "nomenclature:read", "nomenclature:write"]
+ROLES = {
+    "Reader": {"scopes": ["nomenclature:read"]},
+    "Editor": {"inherits": ["Reader"], "scopes": ["nomenclature:*"]},
+    "Admin": {"inherits": ["Editor"], "scopes": ["users:*"]},
+}
+
+
+def test_wildcards_and_role_inheritance_compile_to_masks():
+    compiled = Policy(SCOPES, ROLES)
+    assert compiled.compile(["*"]) == 0b1111
+    assert compiled.compile(["nomenclature:*"]) == 0b1100
+    assert compiled.scope_names(compiled.role_scopes["Admin"]) == tuple(SCOPES)
+    assert compiled.role_mask(("Admin",)) & compiled.allowed_roles_mask(["Reader"])
+    assert not compiled.role_mask(("Reader",)) & compiled.allowed_roles_mask(["Editor"])
+    with pytest.raises(ValueError):
+        compiled.compile(["nomenclature:approve"])
+    with pytest.raises(ValueError):
+        Policy(SCOPES, {"A": {"inherits": ["B"]}, "B": {"inherits": ["A"]}})
+
+
+def test_token_masks_survive_appended_scopes_only():
+    old = Policy(SCOPES, ROLES)
+    claims = old.claims(old.compile(["nomenclature:*"]))
+    assert Policy(SCOPES + ["reports:read"], ROLES).token_mask(claims) == 0b1100
+    assert Policy(list(reversed(SCOPES)), ROLES).token_mask(claims) is None
+    assert old.token_mask({"scm": "-1", "spv": old.version}) is None
+    # tokens from before scope masks
+    assert old.token_mask({"scopes": ["users:read", "gone:scope"]}) == 0b0001
+
+
+def test_shipped_roles_do_not_widen_stored_scopes():
+    admin = User.construct(scopes=["users:read"], roles=[Role(name="Admin")])
+    assert admin.has_permission("users:read")
+    assert not admin.has_permission("users:delete")
+    assert admin.is_in_role("Admin") and not admin.is_in_role("User")
+    assert policy.grants(["users:read"], ["Admin", "User"]) == policy.compile(["users:read"])
+
+
+def test_user_permissions_include_role_grants(monkeypatch):
+    import src.services.policy
+    monkeypatch.setattr(src.services.policy, "policy", Policy(SCOPES, ROLES))
+    user = User.construct(scopes=["users:read"], roles=[Role(name="Editor")])
+    assert user.has_permission("nomenclature:write")
+    assert user.has_permission("nomenclature:*")
+    assert not user.has_permission("users:write")
+    assert not user.has_permission("no-such:scope")
+    assert user.is_in_role("Reader") and not user.is_in_role("Admin")
+
+
+@pytest.mark.asyncio
+async def test_role_auth_checks_the_token_mask():
+    token = CryptoService.create_access_token(
+        {"sub": "alice", "roles": ["Admin"], **policy.claims(policy.compile(["nomenclature:*"]))},
+        timedelta(minutes=1)
+    )
+    logged = await RoleAuth(["Admin"])(SecurityScopes(["nomenclature:read", "nomenclature:write"]), token)
+    assert logged.scopes == ["nomenclature:read", "nomenclature:write", "nomenclature:delete"]
+
+    with pytest.raises(HTTPException) as denied:
+        await RoleAuth(["Admin"])(SecurityScopes(["users:read"]), token)
+    assert denied.value.detail == "Not enough permissions"
+    with pytest.raises(HTTPException) as denied:
+        await RoleAuth(["Admin"])(SecurityScopes([]), CryptoService.create_access_token(
+            {"sub": "bob", "roles": ["User"], **policy.claims(0)}, timedelta(minutes=1)
+        ))
+    assert denied.value.detail == "Not allowed user role."
+
+
+def test_routes_requiring_unknown_scopes_fail_on_startup():
+    api = FastAPI()
+
+    @api.get("/known", dependencies=[Security(adminRole, scopes=["nomenclature:read"])])
+    def known():
+        pass
+
+    policy.compile_routes(api.routes)
+
+    @api.get("/typo", dependencies=[Security(adminRole, scopes=["nomenclature:raed"])])
+    def typo():
+        pass
+
+    with pytest.raises(ValueError, match="/typo: Unknown scope nomenclature:raed"):
+        policy.compile_routes(api.routes)
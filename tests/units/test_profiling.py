@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from src.dataaccess.profiling import SlowQueryLog, query_shape
+
+
+def test_query_shape_keeps_fields_and_operators_only():
+    assert query_shape({"type": "Type", "Name": {"$in": ["a", "b"]}}) == {"Name": {"$in": "?"}, "type": "?"}
+    assert query_shape({"$or": [{"a": 1}, {"b": 2}]}) == {"$or": [{"a": "?"}, {"b": "?"}]}
+
+
+def run_command(log, request_id, filter, duration_ms, returned=1):
+    command = {"find": "nomenclature", "filter": filter, "lsid": {"id": 1}, "$db": "blueprint"}
+    log.started(SimpleNamespace(command_name="find", connection_id=("localhost", 27017), request_id=request_id,
+                                database_name="blueprint", command=command))
+    log.succeeded(SimpleNamespace(command_name="find", connection_id=("localhost", 27017), request_id=request_id,
+                                  duration_micros=duration_ms * 1000,
+                                  reply={"cursor": {"firstBatch": [{}] * returned}}))
+
+
+def test_slow_commands_are_grouped_by_shape_and_explained_once():
+    explains = []
+
+    class FakeDatabase:
+        def command(self, command):
+            explains.append(command)
+            return {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+                    "executionStats": {"totalDocsExamined": 1000, "totalKeysExamined": 0, "nReturned": 1}}
+
+    log = SlowQueryLog(threshold_ms=50)
+    log.client = {"blueprint": FakeDatabase()}
+    run_command(log, 1, {"type": "Type"}, 120)
+    run_command(log, 2, {"type": "Group"}, 80)
+    run_command(log, 3, {"type": "Group"}, 10)  # under the threshold
+    log._explainer.shutdown(wait=True)
+
+    [entry] = log.report()
+    assert entry["count"] == 2
+    assert entry["max_ms"] == 120
+    assert entry["shape"] == {"filter": {"type": "?"}}
+    assert entry["explain"]["plan"] == "COLLSCAN"
+    assert entry["explain"]["docs_examined"] == 1000
+    assert len(explains) == 1
+    assert "lsid" not in explains[0]["explain"] and "$db" not in explains[0]["explain"]
@@ -0,0 +1,41 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from src.dataaccess.commands import _revision_filter, update_by_id
+from src.dependencies import get_expected_revision
+
+
+def test_if_match_parsing():
+    assert get_expected_revision(None) is None
+    assert get_expected_revision('*') is None
+    assert get_expected_revision('"3"') == 3
+    assert get_expected_revision('W/"7"') == 7
+    with pytest.raises(HTTPException) as e:
+        get_expected_revision('"not-a-revision"')
+    assert e.value.status_code == 412
+
+
+def test_revision_filter():
+    id = ObjectId()
+    assert _revision_filter(id, None) == {"_id": id}
+    assert _revision_filter(id, 2) == {"_id": id, "revision": 2}
+    # documents without a revision field are at revision 0
+    assert _revision_filter(id, 0) == {"_id": id, "revision": {"$in": [0, None]}}
+
+
+@pytest.mark.asyncio
+async def test_empty_update_only_bumps_the_revision():
+    class Collection:
+        def get_motor_collection(self):
+            return self
+
+        async def find_one_and_update(self, filter, update, **kwargs):
+            self.update = update
+            return {"_id": filter["_id"], "revision": 1}
+
+    collection = Collection()
+    await update_by_id(collection, ObjectId(), {})
+    assert collection.update == {"$inc": {"revision": 1}}
+    await update_by_id(collection, ObjectId(), {"email": "a@example.com"})
+    assert collection.update == {"$inc": {"revision": 1}, "$set": {"email": "a@example.com"}}
@@ -0,0 +1,116 @@
+from bson import ObjectId
+
+import pytest
+
+from src.dtos.models import Nomenclature
+from src.dtos.viewmodels import nomenclature_row
+from src.inmutables import NomenclatureType
+from src.services.events import CREATED, UPDATED, DELETED
+from src.services.search import NomenclatureSearchIndex, CANDIDATES_PER_RESULT
+
+
+def make(name, type=NomenclatureType.category_check_item, description=None):
+    return {"_id": ObjectId(), "Name": name, "type": type.value, "description": description}
+
+
+@pytest.fixture
+def index():
+    index = NomenclatureSearchIndex()
+    for raw in [
+        make("Categoría principal"),
+        make("Sub categoria"),
+        make("Celsius", NomenclatureType.temperature_unit, "Grados centígrados"),
+        make("Fahrenheit", NomenclatureType.temperature_unit, "Grados"),
+    ]:
+        index.add(nomenclature_row(raw))
+    return index
+
+
+def test_search_is_case_and_accent_insensitive(index):
+    names = [n["Name"] for n in index.search("CATEGORIA")]
+    assert names == ["Categoría principal", "Sub categoria"]
+
+
+def test_search_matches_description_tokens_and_filters_by_type(index):
+    assert [n["Name"] for n in index.search("grados cent")] == ["Celsius"]
+    assert index.search("grados", NomenclatureType.category_check_item) == []
+
+
+def test_index_follows_updates_and_deletes(index):
+    celsius = index.search("celsius")[0]
+    index.add({**celsius, "Name": "Kelvin"})
+    assert index.search("celsius") == []
+    assert index.search("kel")[0]["_id"] == celsius["_id"]
+
+    index.remove(celsius["_id"])
+    assert index.search("kel") == []
+    assert len(index) == 3
+
+
+def test_index_follows_change_stream_events(index):
+    kelvin = nomenclature_row(make("Kelvin", NomenclatureType.temperature_unit))
+    index.apply(CREATED, kelvin)
+    index.apply(UPDATED, {**kelvin, "Name": "Rankine"})
+    assert [n["Name"] for n in index.search("rank")] == ["Rankine"]
+
+    # deletes carry the id as a string
+    index.apply(DELETED, {"_id": str(kelvin["_id"])})
+    assert index.search("rank") == []
+
+
+class FakeCursor:
+    def __init__(self, documents, on_read):
+        self.documents = documents
+        self.on_read = on_read
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            self.on_read()
+            yield document
+
+
+@pytest.mark.asyncio
+async def test_load_reads_projected_rows_and_keeps_changes_made_meanwhile(index, monkeypatch):
+    celsius = make("Celsius", NomenclatureType.temperature_unit)
+    kelvin = nomenclature_row(make("Kelvin", NomenclatureType.temperature_unit))
+    finds = []
+
+    class Collection:
+        def find(self, filter, projection):
+            finds.append(projection)
+            # another worker creates Kelvin while the index is loading
+            return FakeCursor([celsius], lambda: index.apply(CREATED, kelvin))
+
+    monkeypatch.setattr(Nomenclature, "get_motor_collection", classmethod(lambda cls: Collection()))
+    await index.load()
+
+    assert "Name" in finds[0] and "pattern" in finds[0]
+    assert [n["Name"] for n in index.search("c")] == ["Celsius"]
+    assert [n["Name"] for n in index.search("kel")] == ["Kelvin"]
+    assert len(index) == 2
+
+
+class CountingDict(dict):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+def test_short_queries_rank_a_bounded_number_of_candidates():
+    index = NomenclatureSearchIndex()
+    for i in range(20000):
+        index.add(nomenclature_row(make(f"Alpha {i}", description=f"Acme item {i}")))
+    index._entries = CountingDict(index._entries)
+
+    results = index.search("a", limit=10)
+    assert len(results) == 10
+    assert all(n["Name"].startswith("Alpha") for n in results)
+    # candidate lookups plus the results themselves
+    assert index._entries.lookups <= 10 * CANDIDATES_PER_RESULT + 10
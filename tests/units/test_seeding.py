@@ -0,0 +1,46 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from src.inmutables import NomenclatureType
+from src.services.seeding import nomenclature_documents, user_documents, insert_batches
+
+
+def test_same_seed_generates_same_dataset():
+    assert list(nomenclature_documents(200, seed=3)) == list(nomenclature_documents(200, seed=3))
+    assert list(nomenclature_documents(50, seed=3)) != list(nomenclature_documents(50, seed=4))
+    assert len({doc["_id"] for doc in user_documents(1000, "hash", seed=3)}) == 1000
+
+
+def test_nomenclatures_follow_type_rules():
+    documents = list(nomenclature_documents(5000, version=11))
+    assert {doc["version"] for doc in documents} == {11}
+    assert all(1 <= len(doc["Name"]) <= 120 for doc in documents)
+    for doc in documents:
+        assert (doc["level"] is not None) == (doc["type"] == NomenclatureType.type_check_item.value)
+        assert (doc["pattern"] is not None) == (doc["type"] == NomenclatureType.data_type.value)
+    types = Counter(doc["type"] for doc in documents)
+    assert types.most_common(1)[0][0] == NomenclatureType.concept_check_item.value
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.batches = []
+        self.active = self.max_active = 0
+
+    async def insert_many(self, documents, ordered=True):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.batches.append(documents)
+        self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_insert_batches_bounds_concurrency():
+    collection = RecordingCollection()
+    inserted = await insert_batches(collection, user_documents(1050, "hash"), batch_size=100, concurrency=3)
+    assert inserted == 1050
+    assert sorted(len(batch) for batch in collection.batches)[0] == 50
+    assert collection.max_active == 3
@@ -0,0 +1,101 @@
+import sys
+import types
+from base64 import urlsafe_b64encode
+from contextlib import asynccontextmanager
+
+import bson
+import pytest
+from bson import Timestamp
+
+from src.dataaccess.sessions import causal_session, dump_causal_token, load_causal_token
+
+OPERATION_TIME = Timestamp(1650000000, 3)
+CLUSTER_TIME = {"clusterTime": Timestamp(1650000000, 4), "signature": {"hash": b"\0" * 20, "keyId": 1}}
+
+
+def token_of(document):
+    return urlsafe_b64encode(bson.encode(document)).decode()
+
+
+class FakeSession:
+    operation_time = None
+    cluster_time = None
+
+    def advance_operation_time(self, operation_time):
+        self.operation_time = operation_time
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    # stands in for the database module, which connects on import
+    started = []
+
+    class Client:
+        async def start_session(self, causal_consistency):
+            started.append(FakeSession())
+
+            @asynccontextmanager
+            async def session():
+                yield started[-1]
+            return session()
+
+    monkeypatch.setitem(sys.modules, "src.dataaccess.database", types.SimpleNamespace(motor_client=Client()))
+    return started
+
+
+def test_token_round_trip():
+    session = FakeSession()
+    assert dump_causal_token(session) is None
+    session.operation_time, session.cluster_time = OPERATION_TIME, CLUSTER_TIME
+    assert load_causal_token(dump_causal_token(session)) == {
+        "operationTime": OPERATION_TIME, "clusterTime": CLUSTER_TIME
+    }
+
+
+@pytest.mark.parametrize("token", [
+    "not base64 !",
+    token_of({"foo": 1}),
+    token_of({"operationTime": 5}),
+    token_of({"operationTime": OPERATION_TIME, "clusterTime": 5}),
+    token_of({"operationTime": OPERATION_TIME, "clusterTime": {"foo": 1}}),
+])
+def test_malformed_tokens_are_ignored(token):
+    assert load_causal_token(token) is None
+
+
+@pytest.mark.asyncio
+async def test_read_session_advances_to_the_token(sessions):
+    async with causal_session(token_of({"operationTime": OPERATION_TIME, "clusterTime": CLUSTER_TIME})) as session:
+        assert (session.operation_time, session.cluster_time) == (OPERATION_TIME, CLUSTER_TIME)
+    async with causal_session(token_of({"foo": 1})) as session:
+        assert session.operation_time is None
+
+
+@pytest.mark.asyncio
+async def test_listings_read_through_the_read_collection_with_the_session(monkeypatch):
+    from src.dataaccess.queries import find_rows
+    calls = []
+
+    class Cursor:
+        def __aiter__(self):
+            async def rows():
+                yield {"_id": 1}
+            return rows()
+
+    class ReadCollection:
+        def find(self, filters, projection, skip, limit, session):
+            calls.append(("find", session))
+            return Cursor()
+
+        async def count_documents(self, filters, session):
+            calls.append(("count", session))
+            return 1
+
+    database = types.SimpleNamespace(read_collection=lambda document_type: ReadCollection())
+    monkeypatch.setitem(sys.modules, "src.dataaccess.database", database)
+    session = FakeSession()
+    assert await find_rows(object, {}, lambda raw: raw, session=session) == ([{"_id": 1}], 1)
+    assert calls == [("find", session), ("count", session)]
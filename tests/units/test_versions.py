@@ -0,0 +1,105 @@
+import sys
+import types
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from src.dataaccess.commands import delete_with_tombstone, update_by_id
+from src.dataaccess.versions import ChangeVersions, changed_after, merge_changes, versioned, VERSION_NOW
+
+
+def test_versioned_updates_stamp_the_version_and_keep_values_literal():
+    update = versioned({"Name": "$where"}, revision={"$add": ["$revision", 1]})
+    assert update == [{"$set": {
+        "Name": {"$literal": "$where"}, "revision": {"$add": ["$revision", 1]}, "version": VERSION_NOW
+    }}]
+
+
+def test_sync_positions():
+    id = ObjectId()
+    assert changed_after(0, None, 100) == {"version": {"$gte": 0, "$lte": 100}}
+    assert changed_after(5, None, 100) == {"version": {"$gt": 5, "$lte": 100}}
+    # the rest of the changes of version 5, after the last one sent
+    assert changed_after(5, id, 100) == {
+        "$or": [{"version": {"$gt": 5, "$lte": 100}}, {"version": 5, "_id": {"$gt": id}}]
+    }
+
+
+def test_changes_are_merged_in_version_order_and_paged():
+    a, b, c, d = sorted(ObjectId() for _ in range(4))
+    upserts = [{"_id": a, "version": 1}, {"_id": c, "version": 2}]
+    deletes = [{"_id": b, "version": 1}, {"_id": d, "version": 3}]
+
+    page, more = merge_changes(upserts, deletes, 3)
+    assert [(raw["_id"], is_delete) for raw, is_delete in page] == [(a, False), (b, True), (c, False)]
+    assert more
+    page, more = merge_changes(upserts, deletes, 4)
+    assert len(page) == 4 and not more
+
+
+@pytest.mark.asyncio
+async def test_high_water_mark_stays_behind_the_server_clock(monkeypatch):
+    class Database:
+        async def command(self, name):
+            assert name == "isMaster"
+            return {"localTime": datetime(2022, 1, 1, 0, 0, 10)}
+
+    monkeypatch.setitem(sys.modules, "src.dataaccess.database", types.SimpleNamespace(db=Database()))
+    assert await ChangeVersions(settle_seconds=2).high_water_mark() == 1640995210000 - 2000
+
+
+class FakeCollection:
+    def __init__(self, documents=()):
+        self.documents = {document["_id"]: dict(document) for document in documents}
+        self.updates = []
+
+    def get_motor_collection(self):
+        return self
+
+    async def find_one_and_update(self, filter, update, upsert=False, **kwargs):
+        self.updates.append(update)
+        if filter["_id"] not in self.documents and not upsert:
+            return None
+        document = self.documents.setdefault(filter["_id"], {"_id": filter["_id"]})
+        document["version"] = 42
+        return dict(document)
+
+    async def find_one_and_delete(self, filter, session=None):
+        document = self.documents.get(filter["_id"])
+        if document is None or document.get("revision") != filter.get("revision", document.get("revision")):
+            return None
+        return self.documents.pop(filter["_id"])
+
+    async def delete_one(self, filter, session=None):
+        if self.documents.get(filter["_id"], {}).get("version") == filter["version"]:
+            del self.documents[filter["_id"]]
+
+
+@pytest.mark.asyncio
+async def test_update_stamps_the_version_in_the_same_call():
+    id = ObjectId()
+    nomenclatures = FakeCollection([{"_id": id, "revision": 1}])
+    raw = await update_by_id(nomenclatures, id, {"Name": "Kelvin"}, stamp_version=True)
+    assert raw["version"] == 42
+    assert nomenclatures.updates == [versioned({"Name": "Kelvin"}, revision={"$add": [{"$ifNull": ["$revision", 0]}, 1]})]
+
+
+@pytest.mark.asyncio
+async def test_delete_leaves_a_tombstone_with_its_version():
+    id = ObjectId()
+    nomenclatures, tombstones = FakeCollection([{"_id": id, "revision": 1}]), FakeCollection()
+
+    raw, version = await delete_with_tombstone(nomenclatures, tombstones, id, 1)
+    assert raw["_id"] == id and version == 42
+    assert id not in nomenclatures.documents and tombstones.documents[id]["version"] == 42
+
+
+@pytest.mark.asyncio
+async def test_failed_delete_takes_its_tombstone_back():
+    id = ObjectId()
+    nomenclatures, tombstones = FakeCollection([{"_id": id, "revision": 2}]), FakeCollection()
+
+    # somebody updated it meanwhile
+    assert await delete_with_tombstone(nomenclatures, tombstones, id, 1) == (None, None)
+    assert id in nomenclatures.documents and tombstones.documents == {}
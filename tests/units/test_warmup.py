@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from src.services import warmup
+from src.services.warmup import WarmupState
+
+
+@pytest.mark.asyncio
+async def test_a_step_that_hangs_times_out():
+    state = WarmupState(step_timeout=0.05)
+    await state.run_step("mongo_pool", lambda: asyncio.sleep(10))
+
+    assert state.steps["mongo_pool"]["ok"] is False
+    assert state.steps["mongo_pool"]["error"] == "Timed out after 0.05s"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_runs_in_the_background(monkeypatch):
+    async def steps(app, state):
+        state.started_at = warmup.datetime.utcnow()
+        await state.run_step("mongo_pool", lambda: asyncio.sleep(0.05))
+        await state.run_step("mongo_ping", lambda: asyncio.sleep(0))
+        state.finished_at = warmup.datetime.utcnow()
+
+    monkeypatch.setattr(warmup, "warm_up", steps)
+    state = WarmupState()
+    state.start(app=None)
+    await asyncio.sleep(0.01)
+    assert state.warming and not state.ready
+
+    await asyncio.sleep(0.1)
+    assert state.ready and not state.warming
+    await state.stop()
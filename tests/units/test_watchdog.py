@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services.watchdog import LoopWatchdog
+
+
+def blocking_handler():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_captures_blocking_call_with_route():
+    watchdog = LoopWatchdog(threshold_ms=50, interval_ms=10)
+    watchdog.start()
+    try:
+        watchdog.requests[asyncio.current_task()] = {"endpoint": blocking_handler}
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    report = watchdog.report()
+    assert report["max_lag_ms"] >= 250
+    site = report["blocking_sites"][0]
+    assert site["route"] == "blocking_handler"
+    assert "blocking_handler" in site["site"]
+    assert site["max_lag_ms"] >= 250
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_in_coalesced_handler_is_attributed_to_the_route():
+    from starlette.responses import Response
+    from src.services.coalescing import SingleFlight
+
+    async def coalesced_handler():
+        time.sleep(0.3)
+        return Response(b"")
+
+    watchdog = LoopWatchdog(threshold_ms=50, interval_ms=10)
+    watchdog.start()
+    try:
+        watchdog.requests[asyncio.current_task()] = {"endpoint": coalesced_handler}
+        await asyncio.sleep(0.05)
+        # the handler runs in a task of its own
+        await SingleFlight().run("key", "/n", coalesced_handler)
+        await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    site = watchdog.report()["blocking_sites"][0]
+    assert site["route"] == "coalesced_handler"
+    assert "coalesced_handler" in site["site"]